@@ -1,42 +1,71 @@
 from flask import Flask, request
 import os
+import atexit
+import signal
 import logging
-import threading
-import subprocess
 import sys
 from datetime import datetime
+from dotenv import load_dotenv
+
+from heartbeat import read_heartbeat, check_health, DEFAULT_PATH as DEFAULT_HEARTBEAT_PATH
+from supervisor import BotSupervisor
+from metrics import DEFAULT_PATH as DEFAULT_METRICS_PATH
+
+load_dotenv()
 
 app = Flask(__name__)
 
+# Файл состояния, который пишет бот (тот же HEARTBEAT_FILE, что и в bot.py)
+HEARTBEAT_FILE = os.getenv('HEARTBEAT_FILE') or DEFAULT_HEARTBEAT_PATH
+# Метрики, которые бот сохраняет каждые METRICS_SECONDS секунд
+METRICS_FILE = os.getenv('METRICS_FILE') or DEFAULT_METRICS_PATH
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Флаг для отслеживания состояния бота
-bot_process = None
-bot_running = False
+# Процесс бота: вывод читается в фоне, после падения бот перезапускается с растущей задержкой
+supervisor = BotSupervisor(
+    [sys.executable, 'bot.py'],
+    cwd=os.path.dirname(os.path.abspath(__file__)),
+    min_backoff=float(os.getenv('BOT_RESTART_MIN_SECONDS', 1)),
+    max_backoff=float(os.getenv('BOT_RESTART_MAX_SECONDS', 300)),
+    stable_seconds=float(os.getenv('BOT_STABLE_SECONDS', 60)),
+)
+atexit.register(supervisor.stop)
+
+def bot_health():
+    """Состояние бота по его heartbeat: (heartbeat, результат check_health)"""
+    heartbeat = read_heartbeat(HEARTBEAT_FILE)
+    return heartbeat, check_health(heartbeat)
 
 @app.route('/')
 def home():
+    _, health = bot_health()
+    if health['live']:
+        status_class, status_title = "active", "✅ Статус: Активен"
+    else:
+        status_class, status_title = "inactive", "❌ Статус: Не отвечает"
     return """
     <html>
         <head>
             <title>Beauty Salon Bot</title>
             <style>
-                body { font-family: Arial, sans-serif; margin: 40px; }
-                .status { padding: 20px; border-radius: 10px; margin: 20px 0; }
-                .active { background-color: #d4edda; color: #155724; border: 1px solid #c3e6cb; }
-                .inactive { background-color: #f8d7da; color: #721c24; border: 1px solid #f5c6cb; }
-                .button { display: inline-block; padding: 10px 20px; margin: 5px; 
+                body {{ font-family: Arial, sans-serif; margin: 40px; }}
+                .status {{ padding: 20px; border-radius: 10px; margin: 20px 0; }}
+                .active {{ background-color: #d4edda; color: #155724; border: 1px solid #c3e6cb; }}
+                .inactive {{ background-color: #f8d7da; color: #721c24; border: 1px solid #f5c6cb; }}
+                .button {{ display: inline-block; padding: 10px 20px; margin: 5px; 
                          background-color: #007bff; color: white; text-decoration: none; 
-                         border-radius: 5px; }
+                         border-radius: 5px; }}
             </style>
         </head>
         <body>
             <h1>💅 Beauty Salon Bot</h1>
-            <div class="status active">
-                <h2>✅ Статус: Активен</h2>
-                <p>Бот для записи в салон красоты работает</p>
+            <div class="status {}">
+                <h2>{}</h2>
+                <p>Бот для записи в салон красоты</p>
+                <p>{}</p>
                 <p>Время сервера: {}</p>
             </div>
             <div>
@@ -46,27 +75,41 @@ def home():
             </div>
         </body>
     </html>
-    """.format(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    """.format(
+        status_class, status_title, "; ".join(health['problems']) or "Проверки пройдены",
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
 
 @app.route('/health-check')
+@app.route('/live')
 def health_check():
-    """Endpoint для проверки здоровья"""
-    try:
-        # Проверяем, что основные файлы существуют
-        required_files = ['bot.py', 'app.py', '.env']
-        for file in required_files:
-            if not os.path.exists(file):
-                return f"File {file} missing", 500
-        
+    """Liveness: бот обновляет heartbeat и его цикл событий не завис"""
+    _, health = bot_health()
+    if health['live']:
         return "OK", 200
-    except Exception as e:
-        return f"Error: {e}", 500
+    return "; ".join(health['problems']), 503
+
+@app.route('/ready')
+def ready():
+    """Readiness: бот жив, база отвечает вовремя, очередь сообщений не переполнена"""
+    heartbeat, health = bot_health()
+    return {**health, "heartbeat": heartbeat}, 200 if health['ready'] else 503
 
 @app.route('/status')
 def status():
     """Подробный статус системы"""
+    heartbeat, health = bot_health()
+    if not health['live']:
+        bot_status = "down"
+    elif not health['ready']:
+        bot_status = "degraded"
+    else:
+        bot_status = "active"
     status_info = {
-        "status": "active",
+        "status": bot_status,
+        "problems": health['problems'],
+        "heartbeat": heartbeat,
+        "process": supervisor.status(),
         "service": "Beauty Salon Bot",
         "timestamp": datetime.now().isoformat(),
         "python_version": sys.version,
@@ -81,34 +124,71 @@ def status():
     }
     return status_info
 
+@app.route('/metrics')
+def metrics():
+    """Метрики бота и процесса в формате Prometheus"""
+    try:
+        with open(METRICS_FILE, 'r', encoding='utf-8') as f:
+            bot_metrics = f.read()
+        age = datetime.now().timestamp() - os.path.getmtime(METRICS_FILE)
+    except OSError:
+        bot_metrics, age = "", None
+    process = supervisor.status()
+    lines = [
+        "# HELP bot_process_up Процесс бота запущен из app.py",
+        "# TYPE bot_process_up gauge",
+        f"bot_process_up {1 if process['running'] else 0}",
+        "# HELP bot_process_uptime_seconds Время работы процесса бота",
+        "# TYPE bot_process_uptime_seconds gauge",
+        f"bot_process_uptime_seconds {process['uptime_seconds']}",
+        "# HELP bot_process_restarts_total Перезапуски процесса бота",
+        "# TYPE bot_process_restarts_total counter",
+        f"bot_process_restarts_total {process['restarts']}",
+        "# HELP bot_process_crashes_total Падения процесса бота",
+        "# TYPE bot_process_crashes_total counter",
+        f"bot_process_crashes_total {process['crashes']}",
+    ]
+    if age is not None:
+        lines += [
+            "# HELP bot_metrics_age_seconds Сколько секунд назад бот сохранил метрики",
+            "# TYPE bot_metrics_age_seconds gauge",
+            f"bot_metrics_age_seconds {age:.1f}",
+        ]
+    return bot_metrics + "\n".join(lines) + "\n", 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/restart')
 def restart():
     """Перезапуск бота"""
     try:
-        # Здесь можно добавить логику перезапуска бота
-        # Например, запуск бота в отдельном процессе
-        return "Бот готов к работе. Используйте scheduled tasks для автоматического перезапуска.", 200
+        previous = supervisor.status()
+        supervisor.restart()
+        status = supervisor.status()
+        return {
+            "message": "Бот перезапускается",
+            "previous_uptime_seconds": previous['uptime_seconds'],
+            "restarts": status['restarts'],
+            "crashes": status['crashes'],
+        }, 200
     except Exception as e:
         return f"Ошибка: {e}", 500
 
 @app.route('/start-bot')
 def start_bot():
     """Запуск бота через веб-интерфейс"""
-    global bot_process, bot_running
-    
     try:
-        if bot_running:
-            return "Бот уже запущен", 200
-            
-        # Запускаем бота в отдельном процессе
-        bot_process = subprocess.Popen([sys.executable, 'bot.py'], 
-                                     stdout=subprocess.PIPE, 
-                                     stderr=subprocess.PIPE)
-        bot_running = True
-        
+        if not supervisor.start():
+            status = supervisor.status()
+            return f"Бот уже запущен (pid {status['pid']}, работает {status['uptime_seconds']} с)", 200
         return "Бот запущен", 200
     except Exception as e:
         return f"Ошибка запуска бота: {e}", 500
 
+def handle_sigterm(signum, frame):
+    """SIGTERM: останавливаем бота и завершаем веб-приложение"""
+    logger.info("Получен SIGTERM, останавливаем бота")
+    supervisor.stop()
+    sys.exit(0)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    app.run(host='0.0.0.0', port=5000)
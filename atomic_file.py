@@ -0,0 +1,32 @@
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, fsync=False):
+    """Файл для записи, который атомарно подменяет path после выхода из блока.
+
+    Данные пишутся в {path}.tmp, затем os.replace ставит его на место path:
+    читатель видит либо старый файл, либо новый целиком. fsync=True
+    сбрасывает данные на диск до подмены - для файлов, которые должны
+    пережить сбой питания. При ошибке временный файл удаляется, path
+    остается прежним.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_text_atomic(path, text):
+    """Атомарно заменяет содержимое path строкой text"""
+    with atomic_write(path) as f:
+        f.write(text)
@@ -0,0 +1,229 @@
+import time as monotonic_time
+import bisect
+from datetime import datetime, timedelta, time
+
+from booking_repository import to_epoch
+
+
+class _DaySchedule:
+    """Занятые интервалы одного дня, отсортированные по началу"""
+
+    __slots__ = ('starts', 'ends', 'ids', 'max_ends')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        # max_ends[i] - максимальный конец среди интервалов 0..i,
+        # чтобы проверка пересечения работала и для пересекающихся старых записей
+        self.max_ends = []
+
+    def _rebuild_max_ends(self, since):
+        current = self.max_ends[since - 1] if since > 0 else None
+        for i in range(since, len(self.ends)):
+            current = self.ends[i] if current is None else max(current, self.ends[i])
+            if i < len(self.max_ends):
+                self.max_ends[i] = current
+            else:
+                self.max_ends.append(current)
+
+    def add(self, start_ts, end_ts, booking_id):
+        i = bisect.bisect_right(self.starts, start_ts)
+        self.starts.insert(i, start_ts)
+        self.ends.insert(i, end_ts)
+        self.ids.insert(i, booking_id)
+        self.max_ends.insert(i, end_ts)
+        self._rebuild_max_ends(i)
+
+    def remove(self, booking_id):
+        try:
+            i = self.ids.index(booking_id)
+        except ValueError:
+            return False
+        del self.starts[i], self.ends[i], self.ids[i], self.max_ends[i]
+        self._rebuild_max_ends(i)
+        return True
+
+    def overlaps(self, start_ts, end_ts):
+        # Кандидаты - интервалы, начавшиеся раньше конца запрошенного
+        i = bisect.bisect_left(self.starts, end_ts)
+        return i > 0 and self.max_ends[i - 1] > start_ts
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class AvailabilityIndex:
+    """Индекс занятости по дням в памяти.
+
+    Загружается один раз при старте и обновляется при создании и отмене
+    записей, поэтому проверка свободного времени не обращается к базе.
+    Проверка пересечения - бинарный поиск по интервалам дня.
+
+    Кроме записей индекс хранит временные брони: пока клиент вводит
+    контакты и подтверждает запись, выбранное время придержано за ним
+    и другим не предлагается. Бронь снимается при подтверждении, отмене
+    или сама, если клиент не продлил ее (refresh) за hold_ttl_minutes.
+    """
+
+    def __init__(self, opening_hour=9, closing_hour=19, slot_step_minutes=60, hold_ttl_minutes=10):
+        self.opening_hour = opening_hour
+        self.closing_hour = closing_hour
+        self.slot_step_minutes = slot_step_minutes
+        self.hold_ttl = hold_ttl_minutes * 60
+        self._days = {}
+        self._booking_days = {}
+        # Кэш свободных слотов без учета броней: (дата, длительность) -> список времени начала
+        self._slot_cache = {}
+        # Временные брони: владелец -> (дата, start_ts, end_ts, истекает в monotonic)
+        self._holds = {}
+        self._day_holds = {}
+
+    def load(self, bookings):
+        """Заполняет индекс записями из хранилища"""
+        self._days.clear()
+        self._booking_days.clear()
+        self._slot_cache.clear()
+        for booking in bookings:
+            self.add(booking)
+
+    def _invalidate(self, day):
+        for key in [key for key in self._slot_cache if key[0] == day]:
+            del self._slot_cache[key]
+
+    def add(self, booking):
+        """Добавляет запись в индекс"""
+        if booking.get('start_ts') is None or booking.get('status') == 'cancelled':
+            return
+        day = datetime.fromtimestamp(booking['start_ts']).date()
+        self._days.setdefault(day, _DaySchedule()).add(booking['start_ts'], booking['end_ts'], booking['id'])
+        self._booking_days[booking['id']] = day
+        self._invalidate(day)
+
+    def remove(self, booking_id):
+        """Убирает запись из индекса (например, при отмене)"""
+        day = self._booking_days.pop(booking_id, None)
+        if day is None:
+            return False
+        schedule = self._days[day]
+        schedule.remove(booking_id)
+        if not schedule:
+            del self._days[day]
+        self._invalidate(day)
+        return True
+
+    # ==================== ВРЕМЕННЫЕ БРОНИ ====================
+
+    def hold(self, owner, start, duration_minutes):
+        """Придерживает интервал за владельцем (заменяет его прежнюю бронь)"""
+        self.release(owner)
+        day = start.date()
+        self._holds[owner] = (
+            day, to_epoch(start), to_epoch(start + timedelta(minutes=duration_minutes)),
+            monotonic_time.monotonic() + self.hold_ttl
+        )
+        self._day_holds.setdefault(day, set()).add(owner)
+
+    def refresh(self, owner):
+        """Продлевает действующую бронь владельца еще на hold_ttl.
+
+        Возвращает False, если брони нет или она уже истекла (истекшая снимается).
+        """
+        hold = self._holds.get(owner)
+        if hold is None:
+            return False
+        now = monotonic_time.monotonic()
+        if hold[3] <= now:
+            self.release(owner)
+            return False
+        self._holds[owner] = hold[:3] + (now + self.hold_ttl,)
+        return True
+
+    def release(self, owner):
+        """Снимает бронь владельца, если она есть"""
+        hold = self._holds.pop(owner, None)
+        if hold is None:
+            return False
+        owners = self._day_holds.get(hold[0])
+        if owners is not None:
+            owners.discard(owner)
+            if not owners:
+                del self._day_holds[hold[0]]
+        return True
+
+    def _active_holds(self, day, exclude_owner=None):
+        """Действующие брони дня; истекшие по пути удаляются"""
+        now = monotonic_time.monotonic()
+        holds = []
+        for owner in list(self._day_holds.get(day, ())):
+            _, start_ts, end_ts, expires_at = self._holds[owner]
+            if expires_at <= now:
+                self.release(owner)
+            elif owner != exclude_owner:
+                holds.append((start_ts, end_ts))
+        return holds
+
+    # ==================== ПРОВЕРКА ВРЕМЕНИ ====================
+
+    def _overlaps_booking(self, day, start_ts, end_ts):
+        schedule = self._days.get(day)
+        return bool(schedule) and schedule.overlaps(start_ts, end_ts)
+
+    def is_free(self, start, duration_minutes, owner=None):
+        """Проверяет, что интервал не пересекается с записями и чужими бронями"""
+        day = start.date()
+        start_ts = to_epoch(start)
+        end_ts = to_epoch(start + timedelta(minutes=duration_minutes))
+        if self._overlaps_booking(day, start_ts, end_ts):
+            return False
+        return not any(
+            start_ts < hold_end and end_ts > hold_start
+            for hold_start, hold_end in self._active_holds(day, exclude_owner=owner)
+        )
+
+    def free_slots(self, day, duration_minutes, now=None, owner=None):
+        """Свободное время начала процедуры на указанную дату.
+
+        Слоты идут с шагом slot_step_minutes в рабочие часы. Результат для
+        дня кэшируется до следующего изменения записей на этот день;
+        чужие брони и (на сегодня) прошедшее время отбрасываются поверх кэша.
+        """
+        key = (day, duration_minutes)
+        slots = self._slot_cache.get(key)
+        if slots is None:
+            slots = []
+            current = datetime.combine(day, time(self.opening_hour))
+            closing = datetime.combine(day, time(self.closing_hour))
+            step = timedelta(minutes=self.slot_step_minutes)
+            duration = timedelta(minutes=duration_minutes)
+            while current < closing:
+                if not self._overlaps_booking(day, to_epoch(current), to_epoch(current + duration)):
+                    slots.append(current.time())
+                current += step
+            self._slot_cache[key] = slots
+
+        now = now or datetime.now()
+        if day == now.date():
+            slots = [slot for slot in slots if slot > now.time()]
+
+        holds = self._active_holds(day, exclude_owner=owner)
+        if not holds:
+            return list(slots)
+
+        free = []
+        for slot in slots:
+            start = datetime.combine(day, slot)
+            start_ts, end_ts = to_epoch(start), to_epoch(start + timedelta(minutes=duration_minutes))
+            if not any(start_ts < hold_end and end_ts > hold_start for hold_start, hold_end in holds):
+                free.append(slot)
+        return free
+
+    def prune(self, before_day):
+        """Удаляет из индекса прошедшие дни"""
+        for day in [day for day in self._days if day < before_day]:
+            for booking_id in self._days.pop(day).ids:
+                self._booking_days.pop(booking_id, None)
+        for key in [key for key in self._slot_cache if key[0] < before_day]:
+            del self._slot_cache[key]
+        for owner in [owner for owner, hold in self._holds.items() if hold[0] < before_day]:
+            self.release(owner)
@@ -0,0 +1,469 @@
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Формат даты записи, в котором она хранится и показывается пользователю
+DATE_FORMAT = "%d.%m.%Y %H:%M"
+
+# Поля записи в порядке колонок таблицы appointments
+BOOKING_FIELDS = (
+    'id', 'service', 'date', 'duration', 'contacts', 'timestamp', 'chat_id',
+    'user_id', 'username', 'first_name', 'last_name', 'status',
+    'reminder_sent_day', 'reminder_sent_hour', 'start_ts', 'end_ts'
+)
+
+# Индексы для выборок по времени начала записи
+INDEXES = {
+    'idx_appointments_start': '(start_ts)',
+    'idx_appointments_user_start': '(user_id, start_ts)',
+    'idx_appointments_status_start': '(status, start_ts)',
+}
+
+
+def to_epoch(dt):
+    """Переводит локальное время в секунды Unix"""
+    return int(dt.timestamp())
+
+
+def booking_timestamps(date_str, duration_minutes):
+    """Возвращает (start_ts, end_ts) для даты записи или (None, None), если дата некорректна"""
+    try:
+        start = datetime.strptime(date_str, DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None, None
+    return to_epoch(start), to_epoch(start + timedelta(minutes=int(duration_minutes or 0)))
+
+
+def day_bounds(day):
+    """Границы суток [начало, конец) в секундах Unix"""
+    start = datetime.combine(day, datetime.min.time())
+    return to_epoch(start), to_epoch(start + timedelta(days=1))
+
+
+class SlotTakenError(Exception):
+    """Выбранное время пересекается с другой записью"""
+
+
+class BookingRepository:
+    """Единое хранилище записей поверх SQLite.
+
+    Все чтения и записи бота идут через этот класс. Если передан журнал
+    (json_store.BookingJournal), каждое изменение после фиксации
+    транзакции дописывается в него - так ведется JSON-копия базы.
+    """
+
+    def __init__(self, connections, journal=None):
+        # Менеджер соединений (db.ConnectionManager)
+        self.connections = connections
+        self.journal = journal
+
+    def _journal(self, records):
+        """Дописывает изменения в JSON-журнал; его сбой не отменяет запись в базу"""
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(records)
+        except OSError as e:
+            logger.error(f"Ошибка записи журнала {self.journal.log_path}: {e}")
+
+    @staticmethod
+    def _to_dict(row):
+        booking = dict(row)
+        booking['reminder_sent_day'] = bool(booking.get('reminder_sent_day'))
+        booking['reminder_sent_hour'] = bool(booking.get('reminder_sent_hour'))
+        return booking
+
+    def init_schema(self):
+        """Создает таблицу записей, если ее еще нет"""
+        with self.connections.transaction() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS appointments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                service TEXT NOT NULL,
+                date TEXT NOT NULL,
+                duration INTEGER NOT NULL,
+                contacts TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                status TEXT DEFAULT 'pending',
+                reminder_sent_day BOOLEAN DEFAULT FALSE,
+                reminder_sent_hour BOOLEAN DEFAULT FALSE,
+                start_ts INTEGER,
+                end_ts INTEGER
+            )
+            ''')
+            self._migrate_timestamps(conn)
+            for name, columns in INDEXES.items():
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON appointments {columns}')
+            self._create_counters(conn)
+
+    def _create_counters(self, conn):
+        """Счетчики записей по услуге и статусу, которые ведут триггеры базы.
+
+        Общее количество и разбивки для статистики читаются из нескольких
+        строк этой таблицы, а не подсчетом по всем записям.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'booking_counters'"
+        ).fetchone()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS booking_counters (
+            service TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (service, status)
+        )
+        ''')
+        conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_booking_counters_insert AFTER INSERT ON appointments
+        BEGIN
+            INSERT INTO booking_counters (service, status, count)
+            VALUES (NEW.service, COALESCE(NEW.status, 'pending'), 1)
+            ON CONFLICT (service, status) DO UPDATE SET count = count + 1;
+        END
+        ''')
+        conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_booking_counters_delete AFTER DELETE ON appointments
+        BEGIN
+            UPDATE booking_counters SET count = count - 1
+            WHERE service = OLD.service AND status = COALESCE(OLD.status, 'pending');
+        END
+        ''')
+        conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_booking_counters_update AFTER UPDATE OF service, status ON appointments
+        WHEN OLD.service IS NOT NEW.service OR COALESCE(OLD.status, 'pending') IS NOT COALESCE(NEW.status, 'pending')
+        BEGIN
+            UPDATE booking_counters SET count = count - 1
+            WHERE service = OLD.service AND status = COALESCE(OLD.status, 'pending');
+            INSERT INTO booking_counters (service, status, count)
+            VALUES (NEW.service, COALESCE(NEW.status, 'pending'), 1)
+            ON CONFLICT (service, status) DO UPDATE SET count = count + 1;
+        END
+        ''')
+        if not exists:
+            # Первый запуск со счетчиками: заполняем их по уже существующим записям
+            conn.execute('''
+            INSERT INTO booking_counters (service, status, count)
+            SELECT service, COALESCE(status, 'pending'), COUNT(*) FROM appointments
+            GROUP BY service, COALESCE(status, 'pending')
+            ''')
+
+    def _migrate_timestamps(self, conn):
+        """Добавляет колонки start_ts/end_ts в старую базу и заполняет их из текстовой даты"""
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(appointments)')}
+        for column in ('start_ts', 'end_ts'):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE appointments ADD COLUMN {column} INTEGER')
+
+        rows = conn.execute('SELECT id, date, duration FROM appointments WHERE start_ts IS NULL').fetchall()
+        updates = []
+        for row in rows:
+            start_ts, end_ts = booking_timestamps(row['date'], row['duration'])
+            if start_ts is None:
+                logger.warning(f"Запись #{row['id']} с некорректной датой '{row['date']}' не получила start_ts")
+                continue
+            updates.append((start_ts, end_ts, row['id']))
+        if updates:
+            conn.executemany('UPDATE appointments SET start_ts = ?, end_ts = ? WHERE id = ?', updates)
+            logger.info(f"Миграция: заполнены start_ts/end_ts для {len(updates)} записей")
+
+    # ==================== ЗАПИСЬ ====================
+
+    def create(self, booking_data):
+        """Атомарно создает запись и возвращает ее номер.
+
+        Проверка пересечения, выдача номера и вставка идут в одной транзакции
+        BEGIN IMMEDIATE, поэтому два клиента не могут получить один номер или
+        занять одно время. Если время уже занято, бросает SlotTakenError.
+        """
+        booking_data.setdefault('status', 'pending')
+        booking_data['reminder_sent_day'] = False
+        booking_data['reminder_sent_hour'] = False
+        booking_data['start_ts'], booking_data['end_ts'] = booking_timestamps(
+            booking_data['date'], booking_data['duration']
+        )
+        fields = [field for field in BOOKING_FIELDS if field != 'id']
+
+        with self.connections.transaction(immediate=True) as conn:
+            if booking_data['start_ts'] is not None and self._has_overlap(
+                    conn, booking_data['start_ts'], booking_data['end_ts']):
+                raise SlotTakenError(f"Время {booking_data['date']} уже занято")
+            cursor = conn.execute(
+                f"INSERT INTO appointments ({', '.join(fields)}) "
+                f"VALUES ({', '.join('?' for _ in fields)})",
+                tuple(booking_data.get(field) for field in fields)
+            )
+            booking_data['id'] = cursor.lastrowid
+        self._journal([{field: booking_data.get(field) for field in BOOKING_FIELDS}])
+        return booking_data['id']
+
+    def set_status(self, booking_id, status, unless=None):
+        """Меняет статус записи. Возвращает False, если запись не найдена
+        или ее текущий статус равен unless"""
+        with self.connections.transaction() as conn:
+            if unless is None:
+                cursor = conn.execute('UPDATE appointments SET status = ? WHERE id = ?', (status, booking_id))
+            else:
+                cursor = conn.execute(
+                    'UPDATE appointments SET status = ? WHERE id = ? AND status != ?', (status, booking_id, unless)
+                )
+        if cursor.rowcount == 0:
+            return False
+        self._journal([{'id': booking_id, 'status': status}])
+        return True
+
+    def mark_reminders_sent(self, items):
+        """Помечает напоминания как отправленные одной транзакцией.
+
+        items - пары (booking_id, kind), где kind - 'day' или 'hour'.
+        """
+        by_kind = {'day': [], 'hour': []}
+        for booking_id, kind in items:
+            by_kind[kind].append((booking_id,))
+        if not items:
+            return
+
+        with self.connections.transaction() as conn:
+            for kind, ids in by_kind.items():
+                if ids:
+                    conn.executemany(f'UPDATE appointments SET reminder_sent_{kind} = TRUE WHERE id = ?', ids)
+        self._journal([{'id': booking_id, f'reminder_sent_{kind}': True} for booking_id, kind in items])
+
+    # ==================== ЧТЕНИЕ ====================
+
+    def get(self, booking_id):
+        """Возвращает запись по номеру или None"""
+        conn = self.connections.connection()
+        row = conn.execute('SELECT * FROM appointments WHERE id = ?', (booking_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_many(self, booking_ids):
+        """Возвращает записи по номерам в виде словаря {id: запись}"""
+        booking_ids = list(set(booking_ids))
+        if not booking_ids:
+            return {}
+        conn = self.connections.connection()
+        rows = conn.execute(
+            f"SELECT * FROM appointments WHERE id IN ({', '.join('?' for _ in booking_ids)})",
+            booking_ids
+        ).fetchall()
+        return {row['id']: self._to_dict(row) for row in rows}
+
+    def list_all(self):
+        """Все записи в хронологическом порядке"""
+        conn = self.connections.connection()
+        rows = conn.execute('SELECT * FROM appointments ORDER BY start_ts, id').fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def list_page(self, after=None, before=None, limit=10, status=None, services=None,
+                  date_from=None, date_to=None):
+        """Страница записей в хронологическом порядке (keyset-пагинация).
+
+        after/before - курсор (start_ts, id) соседней записи: страница идет
+        сразу после него или сразу перед ним. Стоимость страницы не зависит
+        от ее номера и общего числа записей - это поиск по индексу start_ts
+        и чтение limit строк. Фильтры: статус, список услуг и даты
+        [date_from, date_to] включительно.
+
+        Возвращает (записи, есть_еще) - есть_еще относится к направлению
+        листания: для before это наличие более ранних записей.
+        """
+        conditions = ['start_ts IS NOT NULL']
+        params = []
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        if services:
+            conditions.append(f"service IN ({', '.join('?' for _ in services)})")
+            params.extend(services)
+        if date_from:
+            conditions.append('start_ts >= ?')
+            params.append(day_bounds(date_from)[0])
+        if date_to:
+            conditions.append('start_ts < ?')
+            params.append(day_bounds(date_to)[1])
+
+        order = 'start_ts, id'
+        if after is not None:
+            # Отдельное условие start_ts >= ? позволяет SQLite начать поиск по индексу
+            conditions.append('start_ts >= ? AND (start_ts > ? OR id > ?)')
+            params.extend((after[0], after[0], after[1]))
+        elif before is not None:
+            conditions.append('start_ts <= ? AND (start_ts < ? OR id < ?)')
+            params.extend((before[0], before[0], before[1]))
+            order = 'start_ts DESC, id DESC'
+
+        conn = self.connections.connection()
+        rows = conn.execute(
+            f"SELECT * FROM appointments WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        has_more = len(rows) > limit
+        bookings = [self._to_dict(row) for row in rows[:limit]]
+        if before is not None:
+            bookings.reverse()
+        return bookings, has_more
+
+    def list_for_day(self, day):
+        """Записи на указанную дату, отсортированные по времени"""
+        day_start, day_end = day_bounds(day)
+        conn = self.connections.connection()
+        rows = conn.execute(
+            'SELECT * FROM appointments WHERE start_ts >= ? AND start_ts < ? ORDER BY start_ts, id',
+            (day_start, day_end)
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def list_user_upcoming(self, user_id, now=None):
+        """Актуальные (не прошедшие) записи пользователя"""
+        now = now or datetime.now()
+        conn = self.connections.connection()
+        # Записи с некорректной датой (start_ts IS NULL) все равно показываем
+        rows = conn.execute('''
+        SELECT * FROM appointments
+        WHERE user_id = ? AND (start_ts >= ? OR start_ts IS NULL)
+        ORDER BY id DESC
+        ''', (user_id, to_epoch(now))).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def list_active_since(self, since):
+        """Неотмененные записи, начинающиеся не раньше since"""
+        conn = self.connections.connection()
+        rows = conn.execute('''
+        SELECT * FROM appointments
+        WHERE start_ts >= ? AND status != 'cancelled'
+        ORDER BY start_ts
+        ''', (to_epoch(since),)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _has_overlap(conn, start_ts, end_ts):
+        # Записи не переходят через полночь, поэтому достаточно смотреть начиная с начала суток
+        day_start, _ = day_bounds(datetime.fromtimestamp(start_ts).date())
+        row = conn.execute('''
+        SELECT 1 FROM appointments
+        WHERE start_ts >= ? AND start_ts < ? AND end_ts > ?
+        AND status != 'cancelled'
+        LIMIT 1
+        ''', (day_start, end_ts, start_ts)).fetchone()
+        return row is not None
+
+    def is_time_available(self, start, duration_minutes):
+        """Проверяет, что интервал не пересекается с существующими записями"""
+        return not self._has_overlap(
+            self.connections.connection(),
+            to_epoch(start), to_epoch(start + timedelta(minutes=duration_minutes))
+        )
+
+    def stats_summary(self, now=None, days=7):
+        """Сводная статистика записей.
+
+        Итоги по услугам и статусам берутся из booking_counters, будущие
+        записи считаются одним проходом по индексу start_ts с группировкой
+        по дням и статусам. Возвращает словарь:
+        total, by_status, by_service, upcoming (все будущие),
+        upcoming_active (будущие без отмененных) и upcoming_by_day -
+        список (дата, число неотмененных записей) на ближайшие days дней.
+        """
+        now = now or datetime.now()
+        conn = self.connections.connection()
+
+        by_status, by_service = {}, {}
+        for row in conn.execute('SELECT service, status, count FROM booking_counters WHERE count > 0'):
+            by_status[row['status']] = by_status.get(row['status'], 0) + row['count']
+            by_service[row['service']] = by_service.get(row['service'], 0) + row['count']
+
+        upcoming, upcoming_active, per_day = 0, 0, {}
+        rows = conn.execute('''
+        SELECT date(start_ts, 'unixepoch', 'localtime') AS day, status, COUNT(*) AS count
+        FROM appointments
+        WHERE start_ts >= ?
+        GROUP BY day, status
+        ''', (to_epoch(now),))
+        for row in rows:
+            upcoming += row['count']
+            if row['status'] != 'cancelled':
+                upcoming_active += row['count']
+                per_day[row['day']] = per_day.get(row['day'], 0) + row['count']
+
+        upcoming_by_day = []
+        for offset in range(days):
+            day = (now + timedelta(days=offset)).date()
+            upcoming_by_day.append((day, per_day.get(day.isoformat(), 0)))
+
+        return {
+            'total': sum(by_status.values()),
+            'by_status': by_status,
+            'by_service': by_service,
+            'upcoming': upcoming,
+            'upcoming_active': upcoming_active,
+            'upcoming_by_day': upcoming_by_day,
+        }
+
+    def list_pending_reminders(self, now=None):
+        """Будущие подтвержденные записи, по которым отправлены не все напоминания"""
+        now = now or datetime.now()
+        conn = self.connections.connection()
+        rows = conn.execute('''
+        SELECT * FROM appointments
+        WHERE status = 'confirmed'
+        AND start_ts > ?
+        AND (reminder_sent_day = FALSE OR reminder_sent_hour = FALSE)
+        ORDER BY start_ts
+        ''', (to_epoch(now),)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    # ==================== ИМПОРТ ====================
+
+    def import_bookings(self, bookings):
+        """Импортирует записи (например, из JSON-копии базы).
+
+        Записи, которые уже есть в базе (тот же пользователь, услуга и дата),
+        пропускаются, поэтому повторный импорт безопасен. Если номер записи
+        занят другой записью, ей выдается новый номер.
+        """
+        imported = 0
+        with self.connections.transaction() as conn:
+            for booking in bookings:
+                if not all(booking.get(field) is not None for field in ('service', 'date', 'user_id')):
+                    logger.warning(f"Пропущена неполная запись при импорте: {booking}")
+                    continue
+
+                exists = conn.execute(
+                    'SELECT 1 FROM appointments WHERE user_id = ? AND date = ? AND service = ?',
+                    (booking['user_id'], booking['date'], booking['service'])
+                ).fetchone()
+                if exists:
+                    continue
+
+                values = {field: booking.get(field) for field in BOOKING_FIELDS}
+                values['status'] = values['status'] or 'pending'
+                values['contacts'] = values['contacts'] or ''
+                values['timestamp'] = values['timestamp'] or datetime.now().isoformat()
+                values['chat_id'] = values['chat_id'] or booking['user_id']
+                values['reminder_sent_day'] = bool(values['reminder_sent_day'])
+                values['reminder_sent_hour'] = bool(values['reminder_sent_hour'])
+                values['start_ts'], values['end_ts'] = booking_timestamps(values['date'], values['duration'])
+
+                taken = values['id'] is not None and conn.execute(
+                    'SELECT 1 FROM appointments WHERE id = ?', (values['id'],)
+                ).fetchone()
+                if taken:
+                    logger.warning(f"Номер записи #{values['id']} занят, запись импортирована с новым номером")
+                    values['id'] = None
+
+                conn.execute(
+                    f"INSERT INTO appointments ({', '.join(BOOKING_FIELDS)}) "
+                    f"VALUES ({', '.join('?' for _ in BOOKING_FIELDS)})",
+                    tuple(values[field] for field in BOOKING_FIELDS)
+                )
+                imported += 1
+
+        if imported:
+            logger.info(f"Импортировано записей: {imported}")
+        return imported
@@ -1,101 +1,46 @@
 import os
+import re
 import logging
-import sqlite3
+import signal
 import asyncio
-from datetime import datetime, timedelta
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
-from telegram.request import HTTPXRequest
-from telegram.error import BadRequest
+import secrets
+from datetime import datetime, timedelta, time
+from concurrent.futures import ThreadPoolExecutor
+from telegram import Update, ReplyKeyboardRemove
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, TypeHandler, filters, ContextTypes, CallbackQueryHandler
 from dotenv import load_dotenv
-from dateutil import parser
 
+from db import ConnectionManager, AsyncExecutorProxy
+from booking_repository import BookingRepository, SlotTakenError
+from availability import AvailabilityIndex
+from reminders import ReminderScheduler
+from dispatch import RateLimitedSender
+from transport import build_request
+from webhook import WebhookServer
+from heartbeat import HeartbeatWriter, check_health, DEFAULT_PATH as DEFAULT_HEARTBEAT_PATH
+from metrics import (
+    MetricsRegistry, InstrumentedJobQueue, describe_bot_metrics, instrument_handlers,
+    DEFAULT_PATH as DEFAULT_METRICS_PATH
+)
+from atomic_file import write_text_atomic
+from outbox import OutboxStore, Outbox, LANE_INTERACTIVE
+from notifications import AdminNotifier, parse_admin_routes, parse_admin_digest
+from logging_setup import setup_logging
+from stats import StatsCache
+from json_store import BookingJournal
+from user_cache import UserBookingsCache
+from input_parser import parse_date, parse_time
+from rendering import (
+    MessageRenderer, STATUS_LABELS, SERVICE_CALLBACKS, BOOKING_BUTTONS, MAIN_MENU_KEYBOARD, SERVICE_KEYBOARD,
+    CONTACTS_KEYBOARD, SHARE_CONTACT_KEYBOARD, CONFIRM_KEYBOARD, SUCCESS_KEYBOARD,
+    NO_BOOKINGS_KEYBOARD, time_keyboard
+)
 
-async def check_json_reminders(self, context: ContextTypes.DEFAULT_TYPE):
-    """Проверяет напоминания для записей в JSON"""
-    try:
-        with open('bookings.json', 'r', encoding='utf-8') as f:
-            bookings = [json.loads(line) for line in f.readlines()]
-        
-        current_time = datetime.now()
-        
-        for booking in bookings:
-            # Пропускаем неподтвержденные записи
-            if booking.get('status') != 'confirmed':
-                continue
-            
-            try:
-                booking_datetime = datetime.strptime(booking['date'], "%d.%m.%Y %H:%M")
-                
-                # Напоминание за 1 день
-                day_before = booking_datetime - timedelta(days=1)
-                if current_time >= day_before and not booking.get('reminder_sent_day'):
-                    reminder_text = (
-                        f"⏰ *НАПОМИНАНИЕ О ЗАПИСИ*\n\n"
-                        f"Завтра в {booking['date'].split()[1]} у вас запись:\n"
-                        f"💅 *Услуга:* {booking['service']}\n"
-                        f"📅 *Дата и время:* {booking['date']}\n"
-                        f"⏰ *Продолжительность:* {booking['duration']} мин.\n\n"
-                        f"📞 *Контакты студии:* {STUDIO_CONTACTS['phone']}\n"
-                        f"🏠 *Адрес:* {STUDIO_CONTACTS['address']}\n\n"
-                        "⚠️ Пожалуйста, не опаздывайте!"
-                    )
-                    
-                    await context.bot.send_message(
-                        chat_id=booking['chat_id'],
-                        text=reminder_text,
-                        parse_mode='Markdown'
-                    )
-                    
-                    # Помечаем как отправленное (нужно обновить JSON)
-                    booking['reminder_sent_day'] = True
-                    
-                # Напоминание за 1 час
-                hour_before = booking_datetime - timedelta(hours=1)
-                if current_time >= hour_before and not booking.get('reminder_sent_hour'):
-                    reminder_text = (
-                        f"⏰ *СКОРО НАЧНЕТСЯ ПРОЦЕДУРА!*\n\n"
-                        f"Через 1 час у вас запись:\n"
-                        f"💅 *Услуга:* {booking['service']}\n"
-                        f"📅 *Дата и время:* {booking['date']}\n"
-                        f"⏰ *Продолжительность:* {booking['duration']} мин.\n\n"
-                        f"📞 *Контакты студии:* {STUDIO_CONTACTS['phone']}\n"
-                        f"🏠 *Адрес:* {STUDIO_CONTACTS['address']}\n\n"
-                        "🚗 Успейте вовремя!"
-                    )
-                    
-                    await context.bot.send_message(
-                        chat_id=booking['chat_id'],
-                        text=reminder_text,
-                        parse_mode='Markdown'
-                    )
-                    
-                    booking['reminder_sent_hour'] = True
-                    
-            except Exception as e:
-                logger.error(f"Ошибка обработки напоминания: {e}")
-                continue
-        
-        # Обновляем JSON с пометками о напоминаниях
-        with open('bookings.json', 'w', encoding='utf-8') as f:
-            for booking in bookings:
-                json.dump(booking, f, ensure_ascii=False)
-                f.write('\n')
-                
-    except Exception as e:
-        logger.error(f"Ошибка в check_json_reminders: {e}")
 # Загружаем переменные окружения
 load_dotenv()
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# Настройка логирования: запись в файл идет в отдельном потоке
+setup_logging('bot.log')
 logger = logging.getLogger(__name__)
 
 # ID администраторов из .env
@@ -115,9 +60,55 @@ STUDIO_CONTACTS = {
 MANICURE_SERVICES = ['💅 Маникюр', '👣 Педикюр']
 OTHER_SERVICES = ['🧖 Лазерная эпиляция', '☀️ Моментальный загар', '💄 Визажист', '👁️ Ресницы']
 
+# Кому уходят уведомления о новых записях: услуга -> администраторы (ADMIN_ALL получает все).
+# В .env: ADMIN_ROUTES=manicure,pedicure=<ID>;epilation,tanning=<ID>,<ID>
+ADMIN_ROUTES = parse_admin_routes(os.getenv('ADMIN_ROUTES'), SERVICE_CALLBACKS) or {
+    **{service: {ADMIN_MANICURE} for service in MANICURE_SERVICES},
+    **{service: {ADMIN_OTHER} for service in OTHER_SERVICES},
+}
+# Команды администратора доступны всем получателям уведомлений из ADMIN_ROUTES и ADMIN_ALL
+ADMIN_IDS = frozenset({ADMIN_ALL}.union(*ADMIN_ROUTES.values()))
+
+
+def is_admin(user_id):
+    """Есть ли у пользователя доступ к командам администратора"""
+    return user_id in ADMIN_IDS
+
+
+# Администраторы, получающие несрочные записи сводкой: ADMIN_DIGEST=<ID>=<минуты>;<ID>=<минуты>
+ADMIN_DIGEST = parse_admin_digest(os.getenv('ADMIN_DIGEST'))
+# Записи, до начала которых меньше стольких часов, приходят сразу, без сводки
+ADMIN_URGENT_HOURS = int(os.getenv('ADMIN_URGENT_HOURS', 24))
+
+# Фильтры списка /bookings: слово в аргументах команды -> значение
+BOOKING_STATUS_FILTERS = {
+    'pending': 'pending', 'ожидает': 'pending',
+    'confirmed': 'confirmed', 'подтверждена': 'confirmed',
+    'cancelled': 'cancelled', 'отменена': 'cancelled',
+}
+BOOKING_GROUP_FILTERS = {
+    'manicure': MANICURE_SERVICES, 'маникюр': MANICURE_SERVICES,
+    'other': OTHER_SERVICES, 'другие': OTHER_SERVICES,
+}
+
+# Записей на одной странице /bookings
+BOOKINGS_PAGE_SIZE = 10
+
+# Листание /bookings: /bookings_next_<номер> и /bookings_prev_<номер>
+BOOKINGS_PAGE_PATTERN = re.compile(r'^/bookings_(next|prev)_(\d+)$')
+
+# Новые текстовые сообщения. Исправленные (edited_message) не обрабатываются: в них update.message равен None
+NEW_TEXT = filters.TEXT & filters.UpdateType.MESSAGE
+
 # Состояния диалога
 SERVICE, DATE, TIME, CONTACTS, CONFIRM = range(5)
 
+# Имена состояний диалога в метриках
+STATE_NAMES = {
+    SERVICE: 'SERVICE', DATE: 'DATE', TIME: 'TIME', CONTACTS: 'CONTACTS', CONFIRM: 'CONFIRM',
+    ConversationHandler.TIMEOUT: 'TIMEOUT',
+}
+
 # Длительность процедур в минутах
 SERVICE_DURATIONS = {
     '🧖 Лазерная эпиляция': 30,
@@ -134,87 +125,194 @@ WORKING_HOURS = {
     'end': 19    # 19:00
 }
 
-# Настройки базы данных
-DATABASE = '/home/xDenGor/ego-chat_bot/bookings.db'
+# Лимиты отправки сообщений (Telegram: ~30 сообщений в секунду всего, 1 в секунду в один чат)
+SEND_RATE_GLOBAL = float(os.getenv('SEND_RATE_GLOBAL', 25))
+SEND_RATE_PER_CHAT = float(os.getenv('SEND_RATE_PER_CHAT', 1))
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', 10))
+
+# Режим webhook: если задан WEBHOOK_URL (публичный https-адрес), обновления принимает
+# встроенный HTTP-сервер вместо long polling. Без WEBHOOK_SECRET токен создается при запуске
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# WEBHOOK_SET=0 - не регистрировать webhook в Telegram (локальная проверка через webhook_replay.py)
+WEBHOOK_SET = os.getenv('WEBHOOK_SET', '1') != '0'
+
+# Файл состояния бота для проверок liveness/readiness в app.py и как часто его обновлять
+HEARTBEAT_FILE = os.getenv('HEARTBEAT_FILE') or DEFAULT_HEARTBEAT_PATH
+HEARTBEAT_SECONDS = int(os.getenv('HEARTBEAT_SECONDS', 10))
+
+# Метрики в формате Prometheus: файл, который отдает app.py на /metrics, и как часто его обновлять
+METRICS_FILE = os.getenv('METRICS_FILE') or DEFAULT_METRICS_PATH
+METRICS_SECONDS = int(os.getenv('METRICS_SECONDS', 15))
+
+# Очередь исходящих сообщений: число попыток, задержка перед первым повтором
+# (дальше удваивается до OUTBOX_MAX_RETRY_SECONDS) и сколько дней хранить отправленные
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_RETRY_SECONDS = float(os.getenv('OUTBOX_RETRY_SECONDS', 5))
+OUTBOX_MAX_RETRY_SECONDS = float(os.getenv('OUTBOX_MAX_RETRY_SECONDS', 900))
+OUTBOX_KEEP_DAYS = int(os.getenv('OUTBOX_KEEP_DAYS', 7))
+
+# Шаг между слотами в клавиатуре выбора времени, в минутах
+SLOT_STEP_MINUTES = 60
+
+# Сколько минут выбранное время придерживается за клиентом, пока он оформляет запись.
+# Отсчет идет от последнего шага после выбора времени: ввод контактов и подтверждение продлевают бронь
+SLOT_HOLD_MINUTES = int(os.getenv('SLOT_HOLD_MINUTES', 10))
+# Через сколько минут без ответа клиента диалог записи завершается
+CONVERSATION_TIMEOUT_MINUTES = int(os.getenv('CONVERSATION_TIMEOUT_MINUTES', 30))
+
+# Файлы данных лежат рядом с bot.py, а не в текущей папке: планировщик PythonAnywhere
+# запускает бота из другой папки, и иначе открылись бы новые пустые база и JSON-копия
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Настройки базы данных (относительный DATABASE_PATH считается от BASE_DIR)
+DATABASE = os.path.join(BASE_DIR, os.getenv('DATABASE_PATH') or 'bookings.db')
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+
+# Сколько секунд кэшируется статистика для /admin и /status
+STATS_CACHE_SECONDS = int(os.getenv('STATS_CACHE_SECONDS', 30))
+
+# Кэш "📊 Мои записи": сколько пользователей держать в памяти и как часто перечитывать базу
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1000))
+USER_CACHE_SECONDS = int(os.getenv('USER_CACHE_SECONDS', 600))
+
+# JSON-копия базы: снимок и журнал изменений, сворачиваемый в снимок в фоне
+BOOKINGS_JSON = os.path.join(BASE_DIR, 'bookings.json')
+JOURNAL_COMPACT_THRESHOLD = int(os.getenv('JOURNAL_COMPACT_THRESHOLD', 500))
+JOURNAL_COMPACT_SECONDS = int(os.getenv('JOURNAL_COMPACT_SECONDS', 300))
 
 class BeautySalonBot:
     def __init__(self, token):
         self.token = token
-        # Используем HTTPXRequest для лучшей производительности
-        self.application = Application.builder().token(token).request(HTTPXRequest()).build()
+        self.connections = ConnectionManager(DATABASE, busy_timeout_ms=DB_BUSY_TIMEOUT_MS)
+        self.journal = BookingJournal(BOOKINGS_JSON, JOURNAL_COMPACT_THRESHOLD)
+        self.repository = BookingRepository(self.connections, self.journal)
+        # Один поток базы данных: записи в SQLite идут последовательно
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        # Обработчики работают с базой только через асинхронную обертку
+        self.db = AsyncExecutorProxy(self.repository, self.db_executor)
+        # Очередь исходящих сообщений в той же базе и на том же потоке
+        self.outbox_store = OutboxStore(self.connections)
+        self.outbox_db = AsyncExecutorProxy(self.outbox_store, self.db_executor)
+        self.stats = StatsCache(self.db, STATS_CACHE_SECONDS)
+        self.renderer = MessageRenderer(STUDIO_CONTACTS)
+        self.user_bookings = UserBookingsCache(USER_CACHE_SIZE, USER_CACHE_SECONDS)
+        self.availability = AvailabilityIndex(
+            WORKING_HOURS['start'], WORKING_HOURS['end'], SLOT_STEP_MINUTES, SLOT_HOLD_MINUTES
+        )
+        # Метрики обработчиков, задач и запросов к Telegram API
+        self.metrics = MetricsRegistry()
+        describe_bot_metrics(self.metrics)
+        # Отдельные пулы соединений: отправка запросов к API не ждет long polling
+        # и наоборот. Настройки TG_API_* и TG_UPDATES_* в .env
+        self.api_request = build_request('api', 'TG_API', pool_size=32, registry=self.metrics)
+        self.updates_request = build_request('updates', 'TG_UPDATES', pool_size=1, registry=self.metrics)
+        self.application = (
+            Application.builder()
+            .token(token)
+            .request(self.api_request)
+            .get_updates_request(self.updates_request)
+            .job_queue(InstrumentedJobQueue(self.metrics))
+            .post_init(self.on_startup)
+            .post_shutdown(self.on_shutdown)
+            .build()
+        )
+        self.sender = RateLimitedSender(SEND_RATE_GLOBAL, SEND_RATE_PER_CHAT, SEND_CONCURRENCY)
+        self.outbox = Outbox(
+            self.outbox_db, self.sender, batch_size=SEND_CONCURRENCY, max_attempts=OUTBOX_MAX_ATTEMPTS,
+            retry_seconds=OUTBOX_RETRY_SECONDS, max_retry_seconds=OUTBOX_MAX_RETRY_SECONDS
+        )
+        self.notifier = AdminNotifier(
+            self.outbox, self.renderer, ADMIN_ROUTES, always=[ADMIN_ALL],
+            digest_minutes=ADMIN_DIGEST, urgent_hours=ADMIN_URGENT_HOURS
+        )
+        self.reminders = ReminderScheduler(
+            self.application.job_queue, self.db, self.outbox, self.renderer.reminder
+        )
+        # Время последнего обработанного обновления и файл состояния для внешних проверок
+        self.last_update_at = None
+        self.heartbeat = HeartbeatWriter(HEARTBEAT_FILE, self.heartbeat_fields, HEARTBEAT_SECONDS)
         self.setup_handlers()
+        # Обработчики оборачиваются после регистрации, в том числе внутри диалога записи
+        instrument_handlers(self.application, self.metrics, STATE_NAMES)
+        self.describe_state_metrics()
         self.init_database()
         
     def init_database(self):
         """Инициализация базы данных"""
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
+        self.repository.init_schema()
+        self.outbox_store.init_schema()
         
-        # Таблица записей
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            service TEXT NOT NULL,
-            date TEXT NOT NULL,
-            duration INTEGER NOT NULL,
-            contacts TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            chat_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            status TEXT DEFAULT 'pending',
-            reminder_sent_day BOOLEAN DEFAULT FALSE,
-            reminder_sent_hour BOOLEAN DEFAULT FALSE
-        )
-        ''')
+        # Переносим записи из JSON-копии, которых нет в базе (старые записи или потерянная база)
+        try:
+            self.repository.import_bookings(self.journal.load())
+        except Exception as e:
+            logger.error(f"Ошибка импорта записей из {BOOKINGS_JSON}: {e}")
+        
+        # Дальше JSON-копия ведется журналом от свежего снимка базы
+        try:
+            self.journal.write_snapshot(self.repository.list_all())
+        except OSError as e:
+            logger.error(f"Ошибка записи снимка {BOOKINGS_JSON}: {e}")
+        
+        # Индекс занятости загружается один раз и дальше обновляется при изменениях
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        self.availability.load(self.repository.list_active_since(today))
         
-        conn.commit()
-        conn.close()
+        # Ставим напоминания для уже подтвержденных записей
+        self.reminders.schedule_pending(self.repository.list_pending_reminders())
         
     def setup_handlers(self):
         # ConversationHandler для записи
         conv_handler = ConversationHandler(
-            entry_points=[CommandHandler('start', self.start)],
+            entry_points=[
+                CommandHandler(['start', 'zapis', 'newbooking'], self.start),
+                MessageHandler(filters.Text(BOOKING_BUTTONS) & filters.UpdateType.MESSAGE, self.start),
+            ],
             states={
                 SERVICE: [CallbackQueryHandler(self.get_service)],
-                DATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.get_date)],
-                TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.get_time)],
-                CONTACTS: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.get_contacts)],
-                CONFIRM: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.confirm_booking)],
+                DATE: [MessageHandler(NEW_TEXT & ~filters.COMMAND, self.get_date)],
+                TIME: [MessageHandler(NEW_TEXT & ~filters.COMMAND, self.get_time)],
+                CONTACTS: [MessageHandler(NEW_TEXT & ~filters.COMMAND, self.get_contacts)],
+                CONFIRM: [MessageHandler(NEW_TEXT & ~filters.COMMAND, self.confirm_booking)],
+                ConversationHandler.TIMEOUT: [TypeHandler(Update, self.conversation_timeout)],
             },
             fallbacks=[CommandHandler('cancel', self.cancel)],
+            # /start посреди диалога начинает запись заново (и снимает бронь), а не уходит в маршрутизатор
+            allow_reentry=True,
+            # Таймаут отсчитывается от последнего сообщения клиента и не связан с бронью:
+            # бронь истекает отдельно и проверяется заново на шагах контактов и подтверждения
+            conversation_timeout=CONVERSATION_TIMEOUT_MINUTES * 60,
         )
         
         # Основные обработчики
         self.application.add_handler(conv_handler)
         self.application.add_handler(CommandHandler("help", self.help_command))
         self.application.add_handler(CommandHandler("status", self.status))
-        self.application.add_handler(CommandHandler("zapis", self.start))
         self.application.add_handler(CommandHandler("admin", self.admin_stats))
         self.application.add_handler(CommandHandler("menu", self.main_menu))
         self.application.add_handler(CommandHandler("contacts", self.show_contacts))
         self.application.add_handler(CommandHandler("mybookings", self.show_my_bookings))
-        self.application.add_handler(CommandHandler("newbooking", self.new_booking))
         
         # Новые команды для администраторов
         self.application.add_handler(CommandHandler("bookings", self.show_all_bookings))
         self.application.add_handler(CommandHandler("bookings_today", self.show_today_bookings))
         self.application.add_handler(CommandHandler("bookings_tomorrow", self.show_tomorrow_bookings))
         self.application.add_handler(CommandHandler("confirm", self.confirm_booking_admin))
-        self.application.job_queue.run_repeating(self.check_json_reminders, interval=300, first=10)
-        
-        # Обработчик для пагинации
-        self.application.add_handler(MessageHandler(filters.Regex(r'^/bookings_\d+$'), self.show_all_bookings))
-        
-        # Обработчики для кнопок главного меню
-        self.application.add_handler(MessageHandler(filters.Regex("^📊 Мои записи$"), self.show_my_bookings))
-        self.application.add_handler(MessageHandler(filters.Regex("^ℹ️ О студии$"), self.about_studio))
-        self.application.add_handler(MessageHandler(filters.Regex("^📞 Контакты$"), self.show_contacts))
-        self.application.add_handler(MessageHandler(filters.Regex("^🔄 Главное меню$"), self.main_menu))
-        self.application.add_handler(MessageHandler(filters.Regex("^💅 Новая запись$"), self.new_booking))
-        self.application.add_handler(MessageHandler(filters.Regex("^💅 Записаться на процедуру$"), self.start))
+        self.application.add_handler(CommandHandler("cancelbooking", self.cancel_booking_admin))
+        self.application.add_handler(CommandHandler("export", self.export_bookings))
+        
+        # Кнопки меню, листание /bookings и все остальные тексты - через один маршрутизатор
+        self.menu_routes = {
+            "📊 Мои записи": self.show_my_bookings,
+            "ℹ️ О студии": self.about_studio,
+            "📞 Контакты": self.show_contacts,
+            "🔄 Главное меню": self.main_menu,
+        }
+        self.application.add_handler(MessageHandler(NEW_TEXT, self.route_message))
         
         # Обработчик для callback query
         self.application.add_handler(CallbackQueryHandler(self.handle_callback))
@@ -222,312 +320,269 @@ class BeautySalonBot:
         # Обработчик для контактов
         self.application.add_handler(MessageHandler(filters.CONTACT, self.handle_contact))
         
-        # Добавляем задачу проверки напоминаний
-        self.application.job_queue.run_repeating(self.check_reminders, interval=300, first=10)  # Проверка каждые 5 минут
-
-   # ==================== НОВЫЕ ФУНКЦИИ ДЛЯ МАСТЕРОВ ====================
-
-async def show_all_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает все записи (только для администраторов)"""
-    if update.effective_user.id not in [ADMIN_ALL, ADMIN_MANICURE, ADMIN_OTHER]:
-        await update.message.reply_text("❌ Доступ запрещен")
-        return
-    
-    try:
-        with open('bookings.json', 'r', encoding='utf-8') as f:
-            bookings = [json.loads(line) for line in f.readlines()]
+        # Группа 1 выполняется после основных обработчиков - отмечаем обработанное обновление
+        self.application.add_handler(TypeHandler(Update, self.record_update), group=1)
         
-        if not bookings:
-            await update.message.reply_text("📊 Записей пока нет")
-            return
+        # Раз в сутки убираем прошедшие дни из индекса занятости
+        self.application.job_queue.run_daily(self.prune_availability, time=time(0, 5, tzinfo=datetime.now().astimezone().tzinfo))
+        self.application.job_queue.run_daily(self.prune_outbox, time=time(0, 10, tzinfo=datetime.now().astimezone().tzinfo))
         
-        # Сортируем по дате
-        bookings.sort(key=lambda x: datetime.strptime(x['date'], "%d.%m.%Y %H:%M") 
-                     if 'date' in x else datetime.min)
+        # Журнал JSON-копии сворачивается в снимок, когда накопится достаточно изменений
+        self.application.job_queue.run_repeating(self.compact_journal, interval=JOURNAL_COMPACT_SECONDS)
         
-        # Разбиваем на страницы по 10 записей
-        page = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
-        per_page = 10
-        total_pages = (len(bookings) + per_page - 1) // per_page
-        page = max(1, min(page, total_pages))
+        # Сводки новых записей для администраторов, выбравших этот режим
+        self.notifier.schedule_digests(self.application.job_queue)
         
-        start_idx = (page - 1) * per_page
-        end_idx = min(start_idx + per_page, len(bookings))
-        
-        bookings_text = f"📋 *ВСЕ ЗАПИСИ (страница {page}/{total_pages}):*\n\n"
+        # Метрики для /metrics в app.py
+        self.application.job_queue.run_repeating(self.write_metrics, interval=METRICS_SECONDS, first=1)
+
+    # ==================== НОВЫЕ ФУНКЦИИ ДЛЯ МАСТЕРОВ ====================
+
+    @staticmethod
+    def parse_bookings_filter(args):
+        """Разбирает фильтры /bookings: статус, группа услуг, дата или диапазон дат.
+
+        Пример: /bookings confirmed manicure 01.05.2025-31.05.2025
+        """
+        booking_filter = {}
+        for arg in args or []:
+            word = arg.lower()
+            if word in BOOKING_STATUS_FILTERS:
+                booking_filter['status'] = BOOKING_STATUS_FILTERS[word]
+            elif word in BOOKING_GROUP_FILTERS:
+                booking_filter['group'] = word
+            else:
+                date_from, _, date_to = arg.partition('-')
+                booking_filter['date_from'] = datetime.strptime(date_from, "%d.%m.%Y").date()
+                booking_filter['date_to'] = datetime.strptime(date_to or date_from, "%d.%m.%Y").date()
+        return booking_filter
+
+    async def show_all_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Показывает все записи постранично (только для администраторов)"""
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
         
-        for i, booking in enumerate(bookings[start_idx:end_idx], start_idx + 1):
-            status_emoji = "✅" if booking.get('status') == 'confirmed' else "⏳"
-            status_text = "Подтверждена" if booking.get('status') == 'confirmed' else "Ожидает"
-            
-            bookings_text += (
-                f"{i}. {status_emoji} *{booking['service']}*\n"
-                f"   📅 {booking['date']}\n"
-                f"   👤 {booking.get('first_name', '')} {booking.get('last_name', '')}\n"
-                f"   📞 {booking['contacts']}\n"
-                f"   🔢 №{booking['id']}\n"
-                f"   🏷️ Статус: {status_text}\n"
-                f"   👤 User ID: `{booking.get('user_id', '')}`\n\n"
+        try:
+            # Листание: курсор - запись на краю текущей страницы, фильтры берем из прошлого запроса
+            direction, cursor = None, None
+            navigation = BOOKINGS_PAGE_PATTERN.match(update.message.text or '')
+            if navigation:
+                booking_filter = context.user_data.get('bookings_filter', {})
+                edge = await self.db.get(int(navigation.group(2)))
+                if edge and edge.get('start_ts') is not None:
+                    direction, cursor = navigation.group(1), (edge['start_ts'], edge['id'])
+            else:
+                try:
+                    booking_filter = self.parse_bookings_filter(context.args)
+                except ValueError:
+                    await update.message.reply_text(
+                        "❌ Неверный фильтр. Пример:\n"
+                        "/bookings confirmed manicure 01.05.2025-31.05.2025\n\n"
+                        "Статус: pending, confirmed, cancelled\n"
+                        "Услуги: manicure, other\n"
+                        "Даты: ДД.ММ.ГГГГ или ДД.ММ.ГГГГ-ДД.ММ.ГГГГ"
+                    )
+                    return
+                context.user_data['bookings_filter'] = booking_filter
+            
+            bookings, has_more = await self.db.list_page(
+                after=cursor if direction == 'next' else None,
+                before=cursor if direction == 'prev' else None,
+                limit=BOOKINGS_PAGE_SIZE,
+                status=booking_filter.get('status'),
+                services=BOOKING_GROUP_FILTERS.get(booking_filter.get('group')),
+                date_from=booking_filter.get('date_from'),
+                date_to=booking_filter.get('date_to'),
             )
-        
-        # Добавляем навигацию
-        if total_pages > 1:
-            navigation_text = ""
-            if page > 1:
-                navigation_text += f"⬅️ /bookings_{page-1} "
-            if page < total_pages:
-                navigation_text += f"➡️ /bookings_{page+1}"
             
+            if not bookings:
+                await update.message.reply_text("📊 Записей не найдено" if booking_filter else "📊 Записей пока нет")
+                return
+            
+            bookings_text = "📋 *ВСЕ ЗАПИСИ:*\n"
+            filter_parts = []
+            if booking_filter.get('status'):
+                filter_parts.append(STATUS_LABELS[booking_filter['status']][1])
+            if booking_filter.get('group'):
+                filter_parts.append(', '.join(BOOKING_GROUP_FILTERS[booking_filter['group']]))
+            if booking_filter.get('date_from'):
+                filter_parts.append(
+                    f"{booking_filter['date_from'].strftime('%d.%m.%Y')} - {booking_filter['date_to'].strftime('%d.%m.%Y')}"
+                )
+            if filter_parts:
+                bookings_text += f"🔎 {' | '.join(filter_parts)}\n"
+            bookings_text += "\n"
+            
+            for booking in bookings:
+                bookings_text += self.renderer.admin_list_item(booking)
+            
+            # Добавляем навигацию: соседние страницы начинаются от крайних записей текущей
+            has_prev = has_more if direction == 'prev' else direction == 'next'
+            has_next = has_more if direction != 'prev' else True
+            navigation_text = ""
+            if has_prev:
+                navigation_text += f"⬅️ /bookings\\_prev\\_{bookings[0]['id']} "
+            if has_next:
+                navigation_text += f"➡️ /bookings\\_next\\_{bookings[-1]['id']}"
             bookings_text += navigation_text
-        
-        await update.message.reply_text(bookings_text, parse_mode='Markdown')
-        
-    except Exception as e:
-        logger.error(f"Ошибка показа всех записей: {e}")
-        await update.message.reply_text("❌ Ошибка при получении записей")
-
-async def show_today_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает записи на сегодня (только для администраторов)"""
-    if update.effective_user.id not in [ADMIN_ALL, ADMIN_MANICURE, ADMIN_OTHER]:
-        await update.message.reply_text("❌ Доступ запрещен")
-        return
-    
-    try:
-        with open('bookings.json', 'r', encoding='utf-8') as f:
-            bookings = [json.loads(line) for line in f.readlines()]
-        
-        today = datetime.now().strftime("%d.%m.%Y")
-        today_bookings = []
-        
-        for booking in bookings:
-            if booking.get('date', '').startswith(today):
-                today_bookings.append(booking)
-        
-        if not today_bookings:
-            await update.message.reply_text(f"📅 На сегодня ({today}) записей нет")
-            return
-        
-        # Сортируем по времени
-        today_bookings.sort(key=lambda x: datetime.strptime(x['date'], "%d.%m.%Y %H:%M"))
-        
-        bookings_text = f"📋 *ЗАПИСИ НА СЕГОДНЯ ({today}):*\n\n"
-        
-        for i, booking in enumerate(today_bookings, 1):
-            status_emoji = "✅" if booking.get('status') == 'confirmed' else "⏳"
-            status_text = "Подтверждена" if booking.get('status') == 'confirmed' else "Ожидает"
             
-            bookings_text += (
-                f"{i}. {status_emoji} *{booking['service']}*\n"
-                f"   🕐 {booking['date'].split()[1]}\n"
-                f"   👤 {booking.get('first_name', '')} {booking.get('last_name', '')}\n"
-                f"   📞 {booking['contacts']}\n"
-                f"   🔢 №{booking['id']}\n"
-                f"   🏷️ Статус: {status_text}\n\n"
-            )
-        
-        await update.message.reply_text(bookings_text, parse_mode='Markdown')
-        
-    except Exception as e:
-        logger.error(f"Ошибка показа записей на сегодня: {e}")
-        await update.message.reply_text("❌ Ошибка при получении записей")
-
-async def show_tomorrow_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает записи на завтра (только для администраторов)"""
-    if update.effective_user.id not in [ADMIN_ALL, ADMIN_MANICURE, ADMIN_OTHER]:
-        await update.message.reply_text("❌ Доступ запрещен")
-        return
-    
-    try:
-        with open('bookings.json', 'r', encoding='utf-8') as f:
-            bookings = [json.loads(line) for line in f.readlines()]
-        
-        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%d.%m.%Y")
-        tomorrow_bookings = []
-        
-        for booking in bookings:
-            if booking.get('date', '').startswith(tomorrow):
-                tomorrow_bookings.append(booking)
-        
-        if not tomorrow_bookings:
-            await update.message.reply_text(f"📅 На завтра ({tomorrow}) записей нет")
+            await update.message.reply_text(bookings_text, parse_mode='Markdown')
+            
+        except Exception as e:
+            logger.error(f"Ошибка показа всех записей: {e}")
+            await update.message.reply_text("❌ Ошибка при получении записей")
+
+    async def show_today_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Показывает записи на сегодня (только для администраторов)"""
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text("❌ Доступ запрещен")
             return
         
-        # Сортируем по времени
-        tomorrow_bookings.sort(key=lambda x: datetime.strptime(x['date'], "%d.%m.%Y %H:%M"))
-        
-        bookings_text = f"📋 *ЗАПИСИ НА ЗАВТРА ({tomorrow}):*\n\n"
-        
-        for i, booking in enumerate(tomorrow_bookings, 1):
-            status_emoji = "✅" if booking.get('status') == 'confirmed' else "⏳"
-            status_text = "Подтверждена" if booking.get('status') == 'confirmed' else "Ожидает"
+        try:
+            today = datetime.now().strftime("%d.%m.%Y")
+            today_bookings = await self.db.list_for_day(datetime.now().date())
             
-            bookings_text += (
-                f"{i}. {status_emoji} *{booking['service']}*\n"
-                f"   🕐 {booking['date'].split()[1]}\n"
-                f"   👤 {booking.get('first_name', '')} {booking.get('last_name', '')}\n"
-                f"   📞 {booking['contacts']}\n"
-                f"   🔢 №{booking['id']}\n"
-                f"   🏷️ Статус: {status_text}\n\n"
-            )
-        
-        await update.message.reply_text(bookings_text, parse_mode='Markdown')
-        
-    except Exception as e:
-        logger.error(f"Ошибка показа записей на завтра: {e}")
-        await update.message.reply_text("❌ Ошибка при получении записей")
-
-async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Подтверждение записи администратором"""
-    if update.effective_user.id not in [ADMIN_ALL, ADMIN_MANICURE, ADMIN_OTHER]:
-        await update.message.reply_text("❌ Доступ запрещен")
-        return
-    
-    if not context.args:
-        await update.message.reply_text("❌ Укажите номер записи: /confirm 123")
-        return
-    
-    try:
-        booking_id = int(context.args[0])
-        
-        # Читаем все записи
-        with open('bookings.json', 'r', encoding='utf-8') as f:
-            bookings = [json.loads(line) for line in f.readlines()]
-        
-        # Ищем запись
-        found = False
-        for booking in bookings:
-            if booking.get('id') == booking_id:
-                booking['status'] = 'confirmed'
-                found = True
-                break
-        
-        if not found:
-            await update.message.reply_text("❌ Запись не найдена")
+            if not today_bookings:
+                await update.message.reply_text(f"📅 На сегодня ({today}) записей нет")
+                return
+            
+            bookings_text = f"📋 *ЗАПИСИ НА СЕГОДНЯ ({today}):*\n\n"
+            
+            for i, booking in enumerate(today_bookings, 1):
+                bookings_text += self.renderer.day_list_item(i, booking)
+            
+            await update.message.reply_text(bookings_text, parse_mode='Markdown')
+            
+        except Exception as e:
+            logger.error(f"Ошибка показа записей на сегодня: {e}")
+            await update.message.reply_text("❌ Ошибка при получении записей")
+
+    async def show_tomorrow_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Показывает записи на завтра (только для администраторов)"""
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text("❌ Доступ запрещен")
             return
         
-        # Перезаписываем файл
-        with open('bookings.json', 'w', encoding='utf-8') as f:
-            for booking in bookings:
-                json.dump(booking, f, ensure_ascii=False)
-                f.write('\n')
-        
-        await update.message.reply_text(f"✅ Запись #{booking_id} подтверждена")
-        
-    except ValueError:
-        await update.message.reply_text("❌ Неверный номер записи")
-    except Exception as e:
-        logger.error(f"Ошибка подтверждения записи: {e}")
-        await update.message.reply_text("❌ Ошибка при подтверждении записи")
-        
-    # ==================== СУЩЕСТВУЮЩИЕ ФУНКЦИИ ====================
-
-    async def check_reminders(self, context: ContextTypes.DEFAULT_TYPE):
-        """Проверяет и отправляет напоминания"""
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
+            tomorrow_date = (datetime.now() + timedelta(days=1)).date()
+            tomorrow = tomorrow_date.strftime("%d.%m.%Y")
+            tomorrow_bookings = await self.db.list_for_day(tomorrow_date)
             
-            current_time = datetime.now()
+            if not tomorrow_bookings:
+                await update.message.reply_text(f"📅 На завтра ({tomorrow}) записей нет")
+                return
             
-            # Напоминание за 1 день
-            day_before = current_time + timedelta(days=1)
-            day_before_date = day_before.strftime("%d.%m.%Y")
+            bookings_text = f"📋 *ЗАПИСИ НА ЗАВТРА ({tomorrow}):*\n\n"
             
-            cursor.execute('''
-            SELECT * FROM appointments 
-            WHERE date LIKE ? 
-            AND reminder_sent_day = FALSE
-            AND status = 'confirmed'
-            ''', (f"{day_before_date}%",))
+            for i, booking in enumerate(tomorrow_bookings, 1):
+                bookings_text += self.renderer.day_list_item(i, booking)
             
-            day_reminders = cursor.fetchall()
+            await update.message.reply_text(bookings_text, parse_mode='Markdown')
             
-            for appointment in day_reminders:
-                try:
-                    # Извлекаем время из даты
-                    appointment_time = appointment[2].split()[1]
-                    
-                    reminder_text = (
-                        f"⏰ *НАПОМИНАНИЕ О ЗАПИСИ*\n\n"
-                        f"Завтра в {appointment_time} у вас запись:\n"
-                        f"💅 *Услуга:* {appointment[1]}\n"
-                        f"📅 *Дата и время:* {appointment[2]}\n"
-                        f"⏰ *Продолжительность:* {appointment[3]} мин.\n\n"
-                        f"📞 *Контакты студии:* {STUDIO_CONTACTS['phone']}\n"
-                        f"🏠 *Адрес:* {STUDIO_CONTACTS['address']}\n\n"
-                        "⚠️ Пожалуйста, не опаздывайте!"
-                    )
-                    
-                    await context.bot.send_message(
-                        chat_id=appointment[6],
-                        text=reminder_text,
-                        parse_mode='Markdown'
+        except Exception as e:
+            logger.error(f"Ошибка показа записей на завтра: {e}")
+            await update.message.reply_text("❌ Ошибка при получении записей")
+
+    async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Подтверждение записи администратором"""
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
+        
+        if not context.args:
+            await update.message.reply_text("❌ Укажите номер записи: /confirm 123")
+            return
+        
+        try:
+            booking_id = int(context.args[0])
+            
+            # Отмененную запись не возвращаем: ее время уже освобождено и могло быть занято
+            if not await self.db.set_status(booking_id, 'confirmed', unless='cancelled'):
+                if await self.db.get(booking_id):
+                    await update.message.reply_text(
+                        f"❌ Запись #{booking_id} отменена, подтвердить ее нельзя. Клиенту нужно записаться заново"
                     )
-                    
-                    # Помечаем как отправленное
-                    cursor.execute('''
-                    UPDATE appointments SET reminder_sent_day = TRUE WHERE id = ?
-                    ''', (appointment[0],))
-                    
-                    logger.info(f"Напоминание за день отправлено для записи #{appointment[0]}")
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка отправки напоминания за день: {e}")
+                else:
+                    await update.message.reply_text("❌ Запись не найдена")
+                return
             
-            # Напоминание за 1 час
-            hour_before = current_time + timedelta(hours=1)
-            hour_before_str = hour_before.strftime("%d.%m.%Y %H:%M")
+            self.stats.invalidate()
+            booking = await self.db.get(booking_id)
+            self.user_bookings.update_booking(booking)
+            # Напоминания ставятся только для подтвержденных записей
+            self.reminders.schedule_booking(booking)
             
-            cursor.execute('''
-            SELECT * FROM appointments 
-            WHERE date = ?
-            AND reminder_sent_hour = FALSE
-            AND status = 'confirmed'
-            ''', (hour_before_str,))
+            await update.message.reply_text(f"✅ Запись #{booking_id} подтверждена")
             
-            hour_reminders = cursor.fetchall()
+        except ValueError:
+            await update.message.reply_text("❌ Неверный номер записи")
+        except Exception as e:
+            logger.error(f"Ошибка подтверждения записи: {e}")
+            await update.message.reply_text("❌ Ошибка при подтверждении записи")
+
+    async def cancel_booking_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Отмена записи администратором"""
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
+        
+        if not context.args:
+            await update.message.reply_text("❌ Укажите номер записи: /cancelbooking 123")
+            return
+        
+        try:
+            booking_id = int(context.args[0])
             
-            for appointment in hour_reminders:
-                try:
-                    reminder_text = (
-                        f"⏰ *СКОРО НАЧНЕТСЯ ПРОЦЕДУРА!*\n\n"
-                        f"Через 1 час у вас запись:\n"
-                        f"💅 *Услуга:* {appointment[1]}\n"
-                        f"📅 *Дата и время:* {appointment[2]}\n"
-                        f"⏰ *Продолжительность:* {appointment[3]} мин.\n\n"
-                        f"📞 *Контакты студии:* {STUDIO_CONTACTS['phone']}\n"
-                        f"🏠 *Адрес:* {STUDIO_CONTACTS['address']}\n\n"
-                        "🚗 Успейте вовремя!"
-                    )
-                    
-                    await context.bot.send_message(
-                        chat_id=appointment[6],
-                        text=reminder_text,
-                        parse_mode='Markdown'
-                    )
-                    
-                    # Помечаем как отправленное
-                    cursor.execute('''
-                    UPDATE appointments SET reminder_sent_hour = TRUE WHERE id = ?
-                    ''', (appointment[0],))
-                    
-                    logger.info(f"Напоминание за час отправлено для записи #{appointment[0]}")
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка отправки напоминания за час: {e}")
+            if not await self.db.set_status(booking_id, 'cancelled'):
+                await update.message.reply_text("❌ Запись не найдена")
+                return
             
-            conn.commit()
-            conn.close()
+            self.stats.invalidate()
+            booking = await self.db.get(booking_id)
+            if booking:
+                self.user_bookings.update_booking(booking)
+            # Освобождаем время в индексе занятости и снимаем напоминания
+            self.availability.remove(booking_id)
+            self.reminders.unschedule_booking(booking_id)
             
+            await update.message.reply_text(f"🚫 Запись #{booking_id} отменена")
+            
+        except ValueError:
+            await update.message.reply_text("❌ Неверный номер записи")
+        except Exception as e:
+            logger.error(f"Ошибка отмены записи: {e}")
+            await update.message.reply_text("❌ Ошибка при отмене записи")
+
+    async def export_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Выгрузка всех записей в JSON (только для администраторов)"""
+        if not is_admin(update.effective_user.id):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
+        
+        try:
+            # Снимок обновляется только если с прошлого раза были изменения
+            if self.journal.dirty:
+                await asyncio.get_running_loop().run_in_executor(None, self.journal.compact)
+            summary = await self.stats.get()
+            with open(BOOKINGS_JSON, 'rb') as f:
+                await update.message.reply_document(
+                    document=f,
+                    filename=os.path.basename(BOOKINGS_JSON),
+                    caption=f"📦 Выгружено записей: {summary['total']}"
+                )
         except Exception as e:
-            logger.error(f"Ошибка в check_reminders: {e}")
+            logger.error(f"Ошибка выгрузки записей: {e}")
+            await update.message.reply_text("❌ Ошибка при выгрузке записей")
+            
+    # ==================== СУЩЕСТВУЮЩИЕ ФУНКЦИИ ====================
 
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик всех callback запросов"""
         query = update.callback_query
         await query.answer()
         
-        logger.info(f"Callback received: {query.data}")
+        logger.debug(f"Callback received: {query.data}")
         
         if query.data == 'back':
             await self.main_menu_from_query(query)
@@ -548,231 +603,149 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
                     context.user_data['contacts'] = f"👤 {name} 📱 {phone_number}"
                 else:
                     context.user_data['contacts'] = f"📱 {phone_number}"
+                # Продлеваем бронь; занятость еще раз проверится при подтверждении
+                self.availability.refresh(update.effective_user.id)
                 
                 # Переходим к подтверждению после получения контакта
-                confirm_keyboard = [["✅ Да, подтверждаю", "❌ Нет, отменить"]]
-                reply_markup = ReplyKeyboardMarkup(confirm_keyboard, resize_keyboard=True)
-                
-                confirm_text = (
-                    f"✅ *ПРОВЕРЬТЕ ДАННЫЕ ЗАПИСИ:*\n\n"
-                    f"💅 *Услуга:* {context.user_data['service']}\n"
-                    f"📅 *Дата и время:* {context.user_data['date']}\n"
-                    f"⏰ *Продолжительность:* {context.user_data['duration']} мин.\n"
-                    f"📞 *Контакты:* {context.user_data['contacts']}\n\n"
-                    f"Всё верно? Подтверждаете запись?"
+                await update.message.reply_text(
+                    self.renderer.confirm_text(context.user_data),
+                    reply_markup=CONFIRM_KEYBOARD,
+                    parse_mode='Markdown'
                 )
-                
-                await update.message.reply_text(confirm_text, reply_markup=reply_markup, parse_mode='Markdown')
                 context.user_data['state'] = CONFIRM
                 return CONFIRM
 
     async def main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Главное меню с кнопками"""
-        # Выходим из состояния conversation
+        # Выходим из состояния conversation и снимаем бронь времени
         context.user_data.clear()
-        
-        keyboard = [
-            ["💅 Записаться на процедуру"],
-            ["📊 Мои записи", "ℹ️ О студии"],
-            ["📞 Контакты", "🔄 Главное меню"]
-        ]
-        
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        self.availability.release(update.effective_user.id)
         
         if update.message:
             await update.message.reply_text(
                 "💖 Добро пожаловать в студию красоты!\n\n"
                 "Выберите действие:",
-                reply_markup=reply_markup
+                reply_markup=MAIN_MENU_KEYBOARD
             )
         else:
             await update.callback_query.message.reply_text(
                 "💖 Добро пожаловать в студию красоты!\n\n"
                 "Выберите действие:",
-                reply_markup=reply_markup
+                reply_markup=MAIN_MENU_KEYBOARD
             )
 
-    async def send_admin_notification(self, context, booking_data, chat_id, username, contacts):
+    async def send_admin_notification(self, context, booking_data):
         """Отправляет уведомления администраторам"""
-        service = booking_data['service']
-        user_id = booking_data['user_id']
-        
-        if booking_data.get('username'):
-            telegram_link = f"[@{booking_data['username']}](https://t.me/{booking_data['username']})"
-        else:
-            telegram_link = "Не указан"
-        
-        notification_text = (
-            "🎉 *НОВАЯ ПРЕДВАРИТЕЛЬНАЯ ЗАПИСЬ*\n\n"
-            f"👤 *Клиент:* {username or 'Не указано'}\n"
-            f"📞 *Контакты:* {contacts or 'Не указаны'}\n"
-            f"💅 *Услуга:* {service}\n"
-            f"📅 *Дата и время:* {booking_data['date']}\n"
-            f"⏰ *Продолжительность:* {booking_data['duration']} мин.\n"
-            f"🔢 *Номер записи:* #{booking_data['id']}\n\n"
-            f"🔗 *Telegram:* {telegram_link}\n"
-            f"🆔 *User ID:* `{user_id}`\n"
-            f"💬 *Чат ID:* `{chat_id}`\n\n"
-            "⚠️ *Необходимо связаться с клиентом для подтверждения!*"
-        )
-        
-        admin_ids = set()
-        
-        # Добавляем администраторов в зависимости от услуг
-        if service in MANICURE_SERVICES:
-            admin_ids.add(ADMIN_MANICURE)
-        if service in OTHER_SERVICES:
-            admin_ids.add(ADMIN_OTHER)
-        
-        # Всегда отправляем главному администратору
-        admin_ids.add(ADMIN_ALL)
-        
-        # Отправляем уведомления всем соответствующим администраторам
-        for admin_id in admin_ids:
-            try:
-                await context.bot.send_message(
-                    chat_id=admin_id,
-                    text=notification_text,
-                    parse_mode='Markdown',
-                    disable_web_page_preview=True
-                )
-                logger.info(f"Уведомление отправлено администратору {admin_id}")
-            except Exception as e:
-                logger.error(f"Ошибка отправки уведомления администратору {admin_id}: {e}")
+        try:
+            await self.notifier.notify_new_booking(booking_data)
+        except Exception as e:
+            logger.error(f"Ошибка постановки уведомления администраторам в очередь: {e}")
 
-    def get_next_booking_number(self):
-        """Генерирует номер записи"""
+    async def compact_journal(self, context: ContextTypes.DEFAULT_TYPE):
+        """Сворачивает журнал JSON-копии в снимок"""
+        if not self.journal.needs_compaction:
+            return
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            cursor.execute('SELECT MAX(id) FROM appointments')
-            result = cursor.fetchone()
-            conn.close()
-            return (result[0] or 0) + 1
-        except:
-            return 1
-
-    def save_booking(self, booking_data):
-        """Сохраняет запись в файл"""
+            await asyncio.get_running_loop().run_in_executor(None, self.journal.compact)
+        except Exception as e:
+            logger.error(f"Ошибка сжатия журнала {self.journal.log_path}: {e}")
+
+    async def prune_availability(self, context: ContextTypes.DEFAULT_TYPE):
+        """Убирает прошедшие дни из индекса занятости"""
+        self.availability.prune(datetime.now().date())
+
+    async def prune_outbox(self, context: ContextTypes.DEFAULT_TYPE):
+        """Удаляет из очереди давно обработанные сообщения"""
         try:
-            # Добавляем поля для напоминаний
-            booking_data['reminder_sent_day'] = False
-            booking_data['reminder_sent_hour'] = False
-            
-            with open('bookings.json', 'a', encoding='utf-8') as f:
-                json.dump(booking_data, f, ensure_ascii=False)
-                f.write('\n')
-            return True
+            removed = await self.outbox_db.prune((datetime.now() - timedelta(days=OUTBOX_KEEP_DAYS)).timestamp())
+            logger.info(f"Из очереди сообщений удалено старых: {removed}")
+        except Exception as e:
+            logger.error(f"Ошибка очистки очереди сообщений: {e}")
+
+    async def save_booking(self, booking_data):
+        """Сохраняет запись в базу и возвращает ее номер.
+
+        Если время успели занять, SlotTakenError пробрасывается вызывающему.
+        """
+        try:
+            booking_number = await self.db.create(booking_data)
+            self.availability.add(booking_data)
+            self.stats.invalidate()
+            self.user_bookings.update_booking(booking_data)
+            return booking_number
+        except SlotTakenError:
+            raise
         except Exception as e:
             logger.error(f"Ошибка сохранения записи: {e}")
-            return False
+            return None
 
-    def get_user_bookings(self, user_id):
+    async def get_user_bookings(self, user_id):
         """Возвращает записи пользователя (только актуальные)"""
+        bookings = self.user_bookings.get(user_id)
+        if bookings is not None:
+            return bookings
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            
-            # Получаем все записи пользователя
-            cursor.execute('''
-            SELECT * FROM appointments WHERE user_id = ? ORDER BY id DESC
-            ''', (user_id,))
-            
-            bookings = []
-            current_time = datetime.now()
-            
-            for row in cursor.fetchall():
-                # Проверяем, не прошла ли запись
-                try:
-                    booking_datetime = datetime.strptime(row[2], "%d.%m.%Y %H:%M")
-                    if booking_datetime >= current_time:
-                        bookings.append({
-                            'id': row[0],
-                            'service': row[1],
-                            'date': row[2],
-                            'duration': row[3],
-                            'contacts': row[4],
-                            'timestamp': row[5],
-                            'chat_id': row[6],
-                            'user_id': row[7],
-                            'username': row[8],
-                            'first_name': row[9],
-                            'last_name': row[10],
-                            'status': row[11]
-                        })
-                except:
-                    # Если ошибка формата, все равно показываем
-                    bookings.append({
-                        'id': row[0],
-                        'service': row[1],
-                        'date': row[2],
-                        'duration': row[3],
-                        'contacts': row[4],
-                        'timestamp': row[5],
-                        'chat_id': row[6],
-                        'user_id': row[7],
-                        'username': row[8],
-                        'first_name': row[9],
-                        'last_name': row[10],
-                        'status': row[11]
-                    })
-            
-            conn.close()
+            bookings = await self.db.list_user_upcoming(user_id)
+            self.user_bookings.put(user_id, bookings)
             return bookings
         except Exception as e:
             logger.error(f"Ошибка получения записей: {e}")
             return []
 
-    def is_time_available(self, selected_datetime, duration_minutes):
-        """Проверяет доступно ли время для записи"""
+    def is_time_available(self, selected_datetime, duration_minutes, user_id=None):
+        """Проверяет доступно ли время для записи (своя бронь пользователя не мешает)"""
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            
-            # Получаем все записи на эту дату
-            cursor.execute('''
-            SELECT date, duration FROM appointments 
-            WHERE date LIKE ?
-            ''', (f"{selected_datetime.strftime('%d.%m.%Y')}%",))
-            
-            for row in cursor.fetchall():
-                try:
-                    booking_datetime = datetime.strptime(row[0], "%d.%m.%Y %H:%M")
-                    booking_end = booking_datetime + timedelta(minutes=row[1])
-                    
-                    # Проверяем пересечение временных интервалов
-                    if (selected_datetime < booking_end and selected_datetime + timedelta(minutes=duration_minutes) > booking_datetime):
-                        conn.close()
-                        return False
-                except:
-                    continue
-            
-            conn.close()
-            return True
+            return self.availability.is_free(selected_datetime, duration_minutes, owner=user_id)
         except Exception as e:
             logger.error(f"Ошибка проверки времени: {e}")
             return True
 
+    def keep_hold(self, user_id, context):
+        """Продлевает бронь выбранного времени на следующий шаг диалога.
+
+        Если бронь истекла, время придерживается заново, когда оно еще
+        свободно. Возвращает False, если время за это время заняли.
+        """
+        if self.availability.refresh(user_id):
+            return True
+        start = datetime.strptime(context.user_data['date'], "%d.%m.%Y %H:%M")
+        if not self.is_time_available(start, context.user_data['duration'], user_id):
+            return False
+        self.availability.hold(user_id, start, context.user_data['duration'])
+        return True
+
+    async def offer_other_time(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Выбранное время заняли - снимаем бронь и возвращаем клиента к выбору времени"""
+        self.availability.release(update.effective_user.id)
+        reply_markup, _ = self.build_time_keyboard(
+            datetime.fromisoformat(context.user_data['selected_date']).date(),
+            context.user_data['duration'],
+            update.effective_user.id
+        )
+        await update.message.reply_text(
+            "❌ Это время только что заняли. Пожалуйста, выберите другое время:",
+            reply_markup=reply_markup
+        )
+        context.user_data['state'] = TIME
+        return TIME
+
+    def build_time_keyboard(self, selected_date, duration_minutes, user_id=None):
+        """Клавиатура выбора времени только со свободными слотами.
+
+        Возвращает разметку и признак того, что свободные слоты есть.
+        """
+        slots = self.availability.free_slots(selected_date, duration_minutes, owner=user_id)
+        return time_keyboard(tuple(slots)), bool(slots)
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало записи - выбор услуги"""
         context.user_data.clear()
+        self.availability.release(update.effective_user.id)
         context.user_data['conversation'] = True
         
-        keyboard = [
-            [InlineKeyboardButton("🧖 Лазерная эпиляция", callback_data='epilation')],
-            [InlineKeyboardButton("☀️ Моментальный загар", callback_data='tanning')],
-            [InlineKeyboardButton("💅 Маникюр", callback_data='manicure')],
-            [InlineKeyboardButton("👣 Педикюр", callback_data='pedicure')],
-            [InlineKeyboardButton("💄 Визажист", callback_data='makeup')],
-            [InlineKeyboardButton("👁️ Ресницы", callback_data='lashes')],
-            [InlineKeyboardButton("🔙 Назад", callback_data='back')]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await update.message.reply_text(
             "💅 Выберите услугу для записи:",
-            reply_markup=reply_markup
+            reply_markup=SERVICE_KEYBOARD
         )
         return SERVICE
 
@@ -781,22 +754,13 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
         query = update.callback_query
         await query.answer()
         
-        logger.info(f"Обработка услуги: {query.data}")
+        logger.debug(f"Обработка услуги: {query.data}")
         
         if query.data == 'back':
             await self.main_menu_from_query(query)
             return ConversationHandler.END
         
-        service_map = {
-            'epilation': '🧖 Лазерная эпиляция',
-            'tanning': '☀️ Моментальный загар',
-            'manicure': '💅 Маникюр',
-            'pedicure': '👣 Педикюр',
-            'makeup': '💄 Визажист',
-            'lashes': '👁️ Ресницы'
-        }
-        
-        service_name = service_map.get(query.data)
+        service_name = SERVICE_CALLBACKS.get(query.data)
         if not service_name:
             await query.message.reply_text("Ошибка выбора услуги. Попробуйте снова /start")
             return ConversationHandler.END
@@ -804,24 +768,11 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
         context.user_data['service'] = service_name
         context.user_data['duration'] = SERVICE_DURATIONS.get(service_name, 60)
         
-        # Получаем текущую дату для кнопок
-        today = datetime.now()
-        tomorrow = today + timedelta(days=1)
-        after_tomorrow = today + timedelta(days=2)
-        
-        date_keyboard = [
-            [f"📅 Сегодня ({today.strftime('%d.%m')})", f"📅 Завтра ({tomorrow.strftime('%d.%m')})"],
-            [f"📅 Послезавтра ({after_tomorrow.strftime('%d.%m')})", "📅 Другая дата"],
-            ["🔙 Назад к услугам"]
-        ]
-        
-        reply_markup = ReplyKeyboardMarkup(date_keyboard, resize_keyboard=True)
-        
         await query.message.reply_text(
             f"💅 Вы выбрали: {service_name}\n"
             f"⏰ Продолжительность: {context.user_data['duration']} мин.\n\n"
             "Выберите дату:",
-            reply_markup=reply_markup
+            reply_markup=self.renderer.date_keyboard()
         )
         return DATE
 
@@ -836,29 +787,16 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
                 await self.start(update, context)
                 return SERVICE
             
-            # Определяем выбранную дату
-            today = datetime.now()
-            tomorrow = today + timedelta(days=1)
-            after_tomorrow = today + timedelta(days=2)
-            
-            selected_date = None
-            
-            if "Сегодня" in user_input:
-                selected_date = today.date()
-            elif "Завтра" in user_input:
-                selected_date = tomorrow.date()
-            elif "Послезавтра" in user_input:
-                selected_date = after_tomorrow.date()
-            elif "Другая дата" in user_input:
+            if "Другая дата" in user_input:
                 await update.message.reply_text(
                     "📅 Введите дату в формате ДД.ММ.ГГГГ\n\n"
                     "Пример: 25.12.2024",
                     reply_markup=ReplyKeyboardRemove()
                 )
                 return DATE
-            else:
-                # Парсим введенную пользователем дату
-                selected_date = parser.parse(user_input, dayfirst=True).date()
+            
+            # Кнопки ("📅 Завтра (19.10)") и введенная дата разбираются одним парсером
+            selected_date = parse_date(user_input)
             
             # Проверяем что дата не в прошлом
             if selected_date < datetime.now().date():
@@ -870,20 +808,18 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
             
             context.user_data['selected_date'] = selected_date.isoformat()
             
-            # Предлагаем выбрать время
-            time_keyboard = [
-                ["🕘 09:00", "🕙 10:00", "🕚 11:00"],
-                ["🕛 12:00", "🕐 13:00", "🕑 14:00"],
-                ["🕒 15:00", "🕓 16:00", "🕔 17:00"],
-                ["🕕 18:00", "🕖 19:00", "🕗 Другое время"],
-                ["🔙 Назад к выбору дата"]
-            ]
+            # Предлагаем выбрать время из свободных слотов
+            reply_markup, has_slots = self.build_time_keyboard(
+                selected_date, context.user_data['duration'], update.effective_user.id
+            )
             
-            reply_markup = ReplyKeyboardMarkup(time_keyboard, resize_keyboard=True)
+            if has_slots:
+                prompt = "🕐 Выберите удобное время:"
+            else:
+                prompt = "😔 На эту дату свободного времени нет. Введите другое время или вернитесь к выбору даты:"
             
             await update.message.reply_text(
-                f"📅 Выбрана дата: {selected_date.strftime('%d.%m.%Y')}\n\n"
-                "🕐 Выберите удобное время:",
+                f"📅 Выбрана дата: {selected_date.strftime('%d.%m.%Y')}\n\n{prompt}",
                 reply_markup=reply_markup
             )
             return TIME
@@ -892,23 +828,11 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
             logger.error(f"Ошибка обработки даты: {e}")
             
             # Восстанавливаем клавиатуру выбора даты
-            today = datetime.now()
-            tomorrow = today + timedelta(days=1)
-            after_tomorrow = today + timedelta(days=2)
-            
-            date_keyboard = [
-                [f"📅 Сегодня ({today.strftime('%d.%m')})", f"📅 Завтра ({tomorrow.strftime('%d.%m')})"],
-                [f"📅 Послезавтра ({after_tomorrow.strftime('%d.%m')})", "📅 Другая дата"],
-                ["🔙 Назад к услугам"]
-            ]
-            
-            reply_markup = ReplyKeyboardMarkup(date_keyboard, resize_keyboard=True)
-            
             await update.message.reply_text(
                 "❌ Неверный формат даты.\n\n"
                 "Пожалуйста, выберите дату из кнопок или введите в формате ДД.ММ.ГГГГ\n\n"
                 "Пример: 25.12.2024",
-                reply_markup=reply_markup
+                reply_markup=self.renderer.date_keyboard()
             )
             return DATE
 
@@ -920,26 +844,13 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
             # Обработка кнопок
             if user_input == "🔙 Назад к выбору даты":
                 # Восстанавливаем клавиатуру выбора даты
-                today = datetime.now()
-                tomorrow = today + timedelta(days=1)
-                after_tomorrow = today + timedelta(days=2)
-                
-                date_keyboard = [
-                    [f"📅 Сегодня ({today.strftime('%d.%m')})", f"📅 Завтра ({tomorrow.strftime('%d.%m')})"],
-                    [f"📅 Послезавтра ({after_tomorrow.strftime('%d.%m')})", "📅 Другая дата"],
-                    ["🔙 Назад к услугам"]
-                ]
-                
-                reply_markup = ReplyKeyboardMarkup(date_keyboard, resize_keyboard=True)
-                
                 await update.message.reply_text(
                     "Выберите дату:",
-                    reply_markup=reply_markup
+                    reply_markup=self.renderer.date_keyboard()
                 )
                 return DATE
             
             selected_date = datetime.fromisoformat(context.user_data['selected_date']).date()
-            selected_time = None
             
             if "Другое время" in user_input:
                 await update.message.reply_text(
@@ -949,13 +860,8 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
                 )
                 return TIME
             
-            # Извлекаем время из текста (формат "🕘 09:00")
-            if ":" in user_input:
-                time_part = user_input.split()[-1]  # Берем последнюю часть с временем
-                selected_time = datetime.strptime(time_part, "%H:%M").time()
-            else:
-                # Парсим введенное пользователем время
-                selected_time = datetime.strptime(user_input, "%H:%M").time()
+            # Время с кнопки ("🕘 09:00") или введенное клиентом
+            selected_time = parse_time(user_input)
             
             # Проверяем рабочее время
             if selected_time.hour < WORKING_HOURS['start'] or selected_time.hour >= WORKING_HOURS['end']:
@@ -969,21 +875,22 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
             full_datetime = datetime.combine(selected_date, selected_time)
             
             # Проверяем доступность времени
-            if not self.is_time_available(full_datetime, context.user_data['duration']):
+            if not self.is_time_available(full_datetime, context.user_data['duration'], update.effective_user.id):
+                reply_markup, _ = self.build_time_keyboard(
+                    selected_date, context.user_data['duration'], update.effective_user.id
+                )
                 await update.message.reply_text(
-                    "❌ Это время уже занято. Пожалуйста, выберите другое время:"
+                    "❌ Это время уже занято. Пожалуйста, выберите другое время:",
+                    reply_markup=reply_markup
                 )
                 return TIME
             
             context.user_data['date'] = full_datetime.strftime("%d.%m.%Y %H:%M")
             
-            # Запрашиваем контакты
-            contacts_keyboard = [
-                ["📞 Поделиться контактом"],
-                ["🔙 Назад к выбору времени"]
-            ]
-            reply_markup = ReplyKeyboardMarkup(contacts_keyboard, resize_keyboard=True)
+            # Придерживаем время, пока клиент вводит контакты и подтверждает запись
+            self.availability.hold(update.effective_user.id, full_datetime, context.user_data['duration'])
             
+            # Запрашиваем контакты
             await update.message.reply_text(
                 "📞 *Как с вами связаться для подтверждения записи?*\n\n"
                 "Укажите ваш телефон или другие контакты:\n"
@@ -992,7 +899,7 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
                 "• ✈️ Telegram (@username)\n"
                 "• 📧 Email\n\n"
                 "Или нажмите '📞 Поделиться контактом'",
-                reply_markup=reply_markup,
+                reply_markup=CONTACTS_KEYBOARD,
                 parse_mode='Markdown'
             )
             
@@ -1003,15 +910,11 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
             logger.error(f"Ошибка обработки времени: {e}")
             
             # Восстанавливаем клавиатуру выбора времени
-            time_keyboard = [
-                ["🕘 09:00", "🕙 10:00", "🕚 11:00"],
-                ["🕛 12:00", "🕐 13:00", "🕑 14:00"],
-                ["🕒 15:00", "🕓 16:00", "🕔 17:00"],
-                ["🕕 18:00", "🕖 19:00", "🕗 Другое время"],
-                ["🔙 Назад к выбору даты"]
-            ]
-            
-            reply_markup = ReplyKeyboardMarkup(time_keyboard, resize_keyboard=True)
+            reply_markup, _ = self.build_time_keyboard(
+                datetime.fromisoformat(context.user_data['selected_date']).date(),
+                context.user_data['duration'],
+                update.effective_user.id
+            )
             
             await update.message.reply_text(
                 "❌ Неверный формат времени.\n\n"
@@ -1026,16 +929,15 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
         user_input = update.message.text
         
         if user_input == "🔙 Назад к выбору времени":
-            # Восстанавливаем клавиатуру выбора времени
-            time_keyboard = [
-                ["🕘 09:00", "🕙 10:00", "🕚 11:00"],
-                ["🕛 12:00", "🕐 13:00", "🕑 14:00"],
-                ["🕒 15:00", "🕓 16:00", "🕔 17:00"],
-                ["🕕 18:00", "🕖 19:00", "🕗 Другое время"],
-                ["🔙 Назад к выбору даты"]
-            ]
+            # Клиент выбирает время заново - снимаем бронь
+            self.availability.release(update.effective_user.id)
             
-            reply_markup = ReplyKeyboardMarkup(time_keyboard, resize_keyboard=True)
+            # Восстанавливаем клавиатуру выбора времени
+            reply_markup, _ = self.build_time_keyboard(
+                datetime.fromisoformat(context.user_data['selected_date']).date(),
+                context.user_data['duration'],
+                update.effective_user.id
+            )
             
             await update.message.reply_text(
                 "🕐 Выберите удобное время:",
@@ -1045,31 +947,23 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
         
         if user_input == "📞 Поделиться контактом":
             # Запрашиваем контакт с специальной кнопкой
-            contact_keyboard = [[KeyboardButton("📞 Поделиться контактом", request_contact=True)]]
-            reply_markup = ReplyKeyboardMarkup(contact_keyboard, resize_keyboard=True)
-            
             await update.message.reply_text(
                 "📞 Пожалуйста, нажмите на кнопку ниже, чтобы поделиться контактом:",
-                reply_markup=reply_markup
+                reply_markup=SHARE_CONTACT_KEYBOARD
             )
             return CONTACTS
         
-        context.user_data['contacts'] = user_input
+        # Клиент мог вводить контакты дольше срока брони
+        if not self.keep_hold(update.effective_user.id, context):
+            return await self.offer_other_time(update, context)
         
-        # Кнопки подтверждения
-        confirm_keyboard = [["✅ Да, подтверждаю", "❌ Нет, отменить"]]
-        reply_markup = ReplyKeyboardMarkup(confirm_keyboard, resize_keyboard=True)
+        context.user_data['contacts'] = user_input
         
-        confirm_text = (
-            f"✅ *ПРОВЕРЬТЕ ДАННЫЕ ЗАПИСИ:*\n\n"
-            f"💅 *Услуга:* {context.user_data['service']}\n"
-            f"📅 *Дата и время:* {context.user_data['date']}\n"
-            f"⏰ *Продолжительность:* {context.user_data['duration']} мин.\n"
-            f"📞 *Контакты:* {user_input}\n\n"
-            f"Всё верно? Подтверждаете запись?"
+        await update.message.reply_text(
+            self.renderer.confirm_text(context.user_data),
+            reply_markup=CONFIRM_KEYBOARD,
+            parse_mode='Markdown'
         )
-        
-        await update.message.reply_text(confirm_text, reply_markup=reply_markup, parse_mode='Markdown')
         return CONFIRM
 
     async def confirm_booking(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1079,10 +973,8 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
         if user_input in ["✅ Да, подтверждаю", "да", "yes", "y", "ок", "подтверждаю"]:
             try:
                 user = update.effective_user
-                booking_number = self.get_next_booking_number()
                 
                 booking_data = {
-                    'id': booking_number,
                     'service': context.user_data['service'],
                     'date': context.user_data['date'],
                     'duration': context.user_data['duration'],
@@ -1096,34 +988,29 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
                     'status': 'pending'
                 }
                 
-                if self.save_booking(booking_data):
-                    await self.send_admin_notification(
-                        context, booking_data, update.message.chat_id,
-                        f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username or 'Не указано',
-                        context.user_data['contacts']
-                    )
-                    
-                    # Кнопки после успешной записи
-                    success_keyboard = [
-                        ["💅 Новая запись", "📊 Мои записи"],
-                        ["📞 Контакты", "🔄 Главное меню"]
-                    ]
-                    
-                    reply_markup = ReplyKeyboardMarkup(success_keyboard, resize_keyboard=True)
-                    
+                # Бронь могла истечь, пока клиент читал подтверждение, и время предложили другим
+                if not self.keep_hold(user.id, context):
+                    return await self.offer_other_time(update, context)
+                
+                try:
+                    booking_number = await self.save_booking(booking_data)
+                except SlotTakenError:
+                    # Время заняли, пока клиент вводил контакты - предлагаем выбрать другое
+                    return await self.offer_other_time(update, context)
+                
+                # Запись создана (или не сохранилась) - бронь больше не нужна
+                self.availability.release(user.id)
+                
+                if booking_number:
                     await update.message.reply_text(
-                        f"🎉 *ПРЕДВАРИТЕЛЬНАЯ ЗАПИСЬ #{booking_number} СОЗДАНА!*\n\n"
-                        f"💅 *Услуга:* {context.user_data['service']}\n"
-                        f"📅 *Дата:* {context.user_data['date']}\n"
-                        f"⏰ *Продолжительность:* {context.user_data['duration']} мин.\n"
-                        f"📞 *Контакты:* {context.user_data['contacts']}\n\n"
-                        "⚠️ *Это предварительная запись!*\n"
-                        "Администратор свяжется с вами в ближайшее время для подтверждения.\n\n"
-                        "Спасибо за доверие! 💖",
-                        reply_markup=reply_markup,
+                        self.renderer.created_text(booking_data),
+                        reply_markup=SUCCESS_KEYBOARD,
                         parse_mode='Markdown'
                     )
                     
+                    # Клиент получает ответ, не дожидаясь уведомлений администраторам
+                    await self.send_admin_notification(context, booking_data)
+                    
                     logger.info(f"Создана новая запись #{booking_number}")
                 else:
                     await update.message.reply_text("❌ Произошла ошибка при сохранении записи. Попробуйте позже.")
@@ -1140,61 +1027,25 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
     async def show_my_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показывает записи пользователя (только актуальные)"""
         user_id = update.effective_user.id
-        bookings = self.get_user_bookings(user_id)
+        bookings = await self.get_user_bookings(user_id)
         
         if not bookings:
             await update.message.reply_text(
                 "📋 У вас пока нет актуальных записей.\n\n"
                 "Хотите записаться на процедуру?",
-                reply_markup=ReplyKeyboardMarkup([["💅 Записаться на процедуру"], ["🔄 Главное меню"]], resize_keyboard=True)
+                reply_markup=NO_BOOKINGS_KEYBOARD
             )
             return
         
         bookings_text = "📋 *ВАШИ АКТУАЛЬНЫЕ ЗАПИСИ:*\n\n"
         for i, booking in enumerate(bookings, 1):
-            status_emoji = "✅" if booking.get('status') == 'confirmed' else "⏳"
-            status_text = "Подтверждена" if booking.get('status') == 'confirmed' else "Ожидает подтверждения"
-            bookings_text += (
-                f"{i}. {status_emoji} *{booking['service']}*\n"
-                f"   📅 {booking['date']}\n"
-                f"   🔢 №{booking['id']}\n"
-                f"   📞 {booking.get('contacts', 'Контакты не указаны')}\n"
-                f"   🏷️ Статус: {status_text}\n\n"
-            )
+            bookings_text += self.renderer.client_list_item(i, booking)
         
         await update.message.reply_text(bookings_text, parse_mode='Markdown')
 
     async def show_contacts(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показывает контакты студии"""
-        # Экранируем специальные символы Markdown
-        phone = STUDIO_CONTACTS['phone'].replace('(', '\\(').replace(')', '\\)').replace('+', '\\+')
-        instagram = STUDIO_CONTACTS['instagram'].replace('@', '\\@')
-        address = STUDIO_CONTACTS['address'].replace('.', '\\.').replace('-', '\\-')
-        hours = STUDIO_CONTACTS['hours'].replace(':', '\\:')
-        
-        contacts_text = (
-            "📞 *КОНТАКТЫ СТУДИИ КРАСОТЫ*\n\n"
-            f"📱 *Телефон:* {phone}\n"
-            f"📸 *Instagram:* {instagram}\n"
-            f"🏠 *Адрес:* {address}\n"
-            f"🕐 *Часы работы:* {hours}\n\n"
-            "📍 *Мы ждем вас в гости!*"
-        )
-        
-        try:
-            await update.message.reply_text(contacts_text, parse_mode='Markdown')
-        except BadRequest as e:
-            # Если все равно возникает ошибка, отправляем без Markdown
-            logger.warning(f"Markdown parsing error, sending without formatting: {e}")
-            contacts_text_plain = (
-                "📞 КОНТАКТЫ СТУДИИ КРАСОТЫ\n\n"
-                f"📱 Телефон: {STUDIO_CONTACTS['phone']}\n"
-                f"📸 Instagram: {STUDIO_CONTACTS['instagram']}\n"
-                f"🏠 Адрес: {STUDIO_CONTACTS['address']}\n"
-                f"🕐 Часы работы: {STUDIO_CONTACTS['hours']}\n\n"
-                "📍 Мы ждем вас в гости!"
-            )
-            await update.message.reply_text(contacts_text_plain)
+        await update.message.reply_text(self.renderer.contacts_text, parse_mode='Markdown')
 
     async def about_studio(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Информация о студии"""
@@ -1216,53 +1067,52 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
         )
         await update.message.reply_text(about_text, parse_mode='Markdown')
 
-    async def new_booking(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Новая запись"""
-        await self.start(update, context)
-
     async def main_menu_from_query(self, query):
         """Главное меню из callback query"""
-        keyboard = [
-            ["💅 Записаться на процедуру"],
-            ["📊 Мои записи", "ℹ️ О студии"],
-            ["📞 Контакты", "🔄 Главное меню"]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await query.message.reply_text("💖 Главное меню:", reply_markup=reply_markup)
+        await query.message.reply_text("💖 Главное меню:", reply_markup=MAIN_MENU_KEYBOARD)
 
     async def admin_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Статистика для администраторов"""
-        if update.effective_user.id not in [ADMIN_ALL, ADMIN_MANICURE, ADMIN_OTHER]:
+        if not is_admin(update.effective_user.id):
             await update.message.reply_text("❌ Доступ запрещен")
             return
         
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM appointments')
-            total = cursor.fetchone()[0]
-            
-            # Подсчет актуальных записей
-            current_time = datetime.now()
-            cursor.execute('SELECT date FROM appointments')
-            active_bookings = 0
-            for row in cursor.fetchall():
-                try:
-                    booking_datetime = datetime.strptime(row[0], "%d.%m.%Y %H:%M")
-                    if booking_datetime >= current_time:
-                        active_bookings += 1
-                except:
-                    continue
-            
-            conn.close()
+            summary = await self.stats.get()
             
             stats_text = (
                 f"📊 *СТАТИСТИКА СИСТЕМЫ:*\n\n"
-                f"• Всего записей: {total}\n"
-                f"• Актуальных записей: {active_bookings}\n"
-                f"• Прошедших записей: {total - active_bookings}"
+                f"• Всего записей: {summary['total']}\n"
+                f"• Актуальных записей: {summary['upcoming_active']}\n"
+                f"• Прошедших записей: {summary['total'] - summary['upcoming']}\n"
             )
             
+            if summary['by_status']:
+                stats_text += "\n*По статусам:*\n"
+                for status, count in summary['by_status'].items():
+                    status_emoji, status_text = STATUS_LABELS.get(status, ('•', status))
+                    stats_text += f"{status_emoji} {status_text}: {count}\n"
+            
+            if summary['by_service']:
+                stats_text += "\n*По услугам:*\n"
+                for service, count in sorted(summary['by_service'].items(), key=lambda item: -item[1]):
+                    stats_text += f"{service}: {count}\n"
+            
+            stats_text += "\n*Ближайшие дни:*\n"
+            for day, count in summary['upcoming_by_day']:
+                stats_text += f"📅 {day.strftime('%d.%m')}: {count}\n"
+            
+            stats_text += "\n*Соединения с Telegram:*\n"
+            for request in (self.api_request, self.updates_request):
+                metrics = request.metrics()
+                stats_text += (
+                    f"🌐 {metrics['name']}: запросов {metrics['requests']}, "
+                    f"в работе {metrics['in_flight']} из {metrics['pool_size']} "
+                    f"(макс. {metrics['max_in_flight']}), "
+                    f"ожидание пула {metrics['pool_wait_avg'] * 1000:.0f}/{metrics['pool_wait_max'] * 1000:.0f} мс, "
+                    f"таймаутов пула {metrics['pool_timeouts']}\n"
+                )
+            
             await update.message.reply_text(stats_text, parse_mode='Markdown')
         except Exception as e:
             logger.error(f"Ошибка статистики: {e}")
@@ -1273,6 +1123,40 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
         await self.main_menu(update, context)
         return ConversationHandler.END
 
+    async def conversation_timeout(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Диалог записи не завершен вовремя - снимаем бронь времени"""
+        context.user_data.clear()
+        if update.effective_user:
+            self.availability.release(update.effective_user.id)
+        if update.effective_chat:
+            await self.outbox.put(
+                LANE_INTERACTIVE,
+                update.effective_chat.id,
+                "⌛ Время на оформление записи истекло. Чтобы записаться, начните заново: /start"
+            )
+
+    async def route_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Маршрутизатор текстовых сообщений вне диалога записи.
+
+        Кнопка меню ищется по точному тексту в словаре, поэтому стоимость
+        выбора обработчика не растет с числом кнопок.
+        """
+        text = update.message.text
+        handler = self.menu_routes.get(text)
+        if handler:
+            return await handler(update, context)
+        
+        if BOOKINGS_PAGE_PATTERN.match(text):
+            return await self.show_all_bookings(update, context)
+        
+        if text.startswith('/'):
+            await update.message.reply_text("❓ Неизвестная команда. Список команд: /help")
+        else:
+            await update.message.reply_text(
+                "🤔 Не удалось распознать сообщение. Выберите действие в меню:",
+                reply_markup=MAIN_MENU_KEYBOARD
+            )
+
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда помощи"""
         help_text = (
@@ -1289,28 +1173,12 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
     async def status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Статус записей"""
         try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM appointments')
-            total = cursor.fetchone()[0]
-            
-            current_time = datetime.now()
-            cursor.execute('SELECT date FROM appointments')
-            active_bookings = 0
-            for row in cursor.fetchall():
-                try:
-                    booking_datetime = datetime.strptime(row[0], "%d.%m.%Y %H:%M")
-                    if booking_datetime >= current_time:
-                        active_bookings += 1
-                except:
-                    continue
-            
-            conn.close()
+            summary = await self.stats.get()
             
             status_text = (
                 f"📊 *СТАТУС СИСТЕМЫ:*\n\n"
-                f"• Всего записей: {total}\n"
-                f"• Актуальных записей: {active_bookings}\n"
+                f"• Всего записей: {summary['total']}\n"
+                f"• Актуальных записей: {summary['upcoming_active']}\n"
                 f"• Система работает нормально ✅"
             )
             
@@ -1319,9 +1187,158 @@ async def confirm_booking_admin(self, update: Update, context: ContextTypes.DEFA
             logger.error(f"Ошибка статуса: {e}")
             await update.message.reply_text("📊 Записей пока нет\n✅ Система работает нормально")
 
+    async def record_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Отмечает время последнего обработанного обновления для heartbeat"""
+        self.last_update_at = datetime.now().timestamp()
+
+    async def heartbeat_fields(self):
+        """Состояние бота для heartbeat: последние события, очередь и задержка базы"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            outbox_depth = await self.outbox_db.pending_count()
+            db_latency = round(loop.time() - started, 4)
+        except Exception as e:
+            logger.error(f"Ошибка проверки базы для heartbeat: {e}")
+            outbox_depth = db_latency = None
+        return {
+            'mode': 'webhook' if WEBHOOK_URL else 'polling',
+            'last_update_at': self.last_update_at,
+            'last_reminder_run_at': self.reminders.last_run,
+            'outbox_depth': outbox_depth,
+            'db_latency': db_latency,
+        }
+
+    def describe_state_metrics(self):
+        """Датчики состояния бота: пулы соединений, heartbeat, webhook"""
+        for name, help_text in (
+            ('telegram_pool_size', 'Размер пула соединений с Telegram'),
+            ('telegram_pool_in_flight', 'Запросы к Telegram в работе'),
+            ('telegram_pool_wait_seconds_total', 'Суммарное ожидание свободного соединения'),
+            ('telegram_pool_timeouts_total', 'Запросы, не дождавшиеся соединения'),
+            ('bot_event_loop_lag_seconds', 'Задержка цикла событий по heartbeat'),
+            ('bot_db_latency_seconds', 'Время запроса к базе по heartbeat'),
+            ('bot_outbox_pending', 'Неотправленные сообщения в очереди'),
+            ('bot_update_queue_size', 'Обновления в очереди приложения'),
+        ):
+            kind = 'counter' if name.endswith('_total') else 'gauge'
+            self.metrics.describe(name, kind, help_text)
+        self.metrics.add_collector(self.api_request.gauges)
+        self.metrics.add_collector(self.updates_request.gauges)
+        self.metrics.add_collector(self.state_gauges)
+
+    def state_gauges(self):
+        heartbeat = self.heartbeat.last or {}
+        return [
+            ('bot_event_loop_lag_seconds', (), heartbeat.get('loop_lag')),
+            ('bot_db_latency_seconds', (), heartbeat.get('db_latency')),
+            ('bot_outbox_pending', (), heartbeat.get('outbox_depth')),
+            ('bot_update_queue_size', (), self.application.update_queue.qsize()),
+        ]
+
+    async def write_metrics(self, context: ContextTypes.DEFAULT_TYPE):
+        """Сохраняет метрики в файл, который app.py отдает на /metrics"""
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, write_text_atomic, METRICS_FILE, self.metrics.render()
+            )
+        except OSError as e:
+            logger.error(f"Ошибка записи метрик {METRICS_FILE}: {e}")
+
+    async def metrics_route(self):
+        """GET /metrics в режиме webhook"""
+        return 200, self.metrics.render()
+
+    async def on_startup(self, application):
+        """Запускает отправку очереди сообщений, включая оставшиеся с прошлого запуска, и heartbeat"""
+        self.outbox.start(application.bot)
+        self.heartbeat.start()
+
+    async def on_shutdown(self, application):
+        """Останавливает heartbeat, очередь сообщений и поток базы данных, закрывает соединения"""
+        await self.heartbeat.stop()
+        await self.outbox.stop()
+        # Дожидаемся текущих запросов к базе
+        self.db_executor.shutdown(wait=True)
+        self.connections.close_all()
+        if self.journal.dirty:
+            try:
+                self.journal.compact()
+            except Exception as e:
+                logger.error(f"Ошибка сжатия журнала {self.journal.log_path}: {e}")
+
+    async def health_route(self):
+        """GET /health-check и /live в режиме webhook"""
+        health = check_health(self.heartbeat.last)
+        return (200, "OK") if health['live'] else (503, "; ".join(health['problems']))
+
+    async def ready_route(self):
+        """GET /ready в режиме webhook"""
+        health = check_health(self.heartbeat.last)
+        return (200 if health['ready'] else 503), health
+
+    async def status_route(self):
+        """GET /status в режиме webhook"""
+        health = check_health(self.heartbeat.last)
+        return 200, {
+            "status": "active" if health['ready'] else "degraded",
+            "service": "Beauty Salon Bot",
+            "mode": "webhook",
+            "timestamp": datetime.now().isoformat(),
+            "problems": health['problems'],
+            "heartbeat": self.heartbeat.last,
+            **self.webhook.stats(),
+        }
+
+    async def run_webhook(self):
+        """Режим webhook: HTTP-сервер в цикле событий бота принимает обновления.
+
+        Сервер кладет обновления в update_queue приложения и отвечает на
+        /health-check, /live, /ready, /status и /metrics. Работает до SIGINT или SIGTERM.
+        """
+        secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self.webhook = WebhookServer(
+            self.application, WEBHOOK_PATH, secret,
+            routes={
+                '/health-check': self.health_route, '/live': self.health_route,
+                '/ready': self.ready_route, '/status': self.status_route,
+                '/metrics': self.metrics_route,
+            },
+            host=WEBHOOK_LISTEN, port=WEBHOOK_PORT
+        )
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        # Тот же порядок, что и в run_polling: initialize, post_init, start ... stop, shutdown, post_shutdown
+        await self.application.initialize()
+        try:
+            await self.on_startup(self.application)
+            await self.application.start()
+            await self.webhook.start()
+            if WEBHOOK_SET:
+                await self.application.bot.set_webhook(
+                    WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH, secret_token=secret, allowed_updates=Update.ALL_TYPES
+                )
+                logger.info(f"Webhook установлен: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+            else:
+                logger.info("WEBHOOK_SET=0: webhook в Telegram не регистрируется, обновления принимаются только локально")
+            await stop.wait()
+        finally:
+            await self.webhook.stop()
+            if self.application.running:
+                await self.application.stop()
+            await self.application.shutdown()
+            await self.on_shutdown(self.application)
+
     def run(self):
-        logger.info("Бот запущен!")
-        self.application.run_polling()
+        if WEBHOOK_URL:
+            logger.info("Бот запущен в режиме webhook!")
+            asyncio.run(self.run_webhook())
+        else:
+            logger.info("Бот запущен!")
+            self.application.run_polling()
 
 if __name__ == '__main__':
     token = os.getenv('BOT_TOKEN')
@@ -1331,10 +1348,5 @@ if __name__ == '__main__':
         print("Установите переменную: export BOT_TOKEN='ваш_токен'")
         exit(1)
 
-    # Создаем файл для записей если его нет
-    if not os.path.exists('bookings.json'):
-        with open('bookings.json', 'w', encoding='utf-8') as f:
-            f.write('')
-
     bot = BeautySalonBot(token)
     bot.run()
\ No newline at end of file
@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """Долгоживущие соединения с SQLite.
+
+    На каждый поток открывается одно соединение, которое живет до
+    close_all(): журнал WAL, synchronous=NORMAL, ожидание блокировки
+    busy_timeout и кэш подготовленных выражений. Соединения работают в
+    режиме автокоммита, транзакции открываются явно через transaction().
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000, cached_statements=256):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            cached_statements=self.cached_statements,
+            # Соединение используется только своим потоком; флаг нужен, чтобы
+            # close_all() мог закрыть его из основного потока при остановке
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA foreign_keys=ON')
+        with self._lock:
+            self._connections.append(conn)
+        logger.debug(f"Открыто соединение с базой {self.path} в потоке {threading.current_thread().name}")
+        return conn
+
+    def connection(self):
+        """Соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Транзакция на соединении текущего потока.
+
+        immediate=True берет блокировку записи сразу (BEGIN IMMEDIATE), чтобы
+        проверка и запись внутри транзакции не разошлись с другими писателями.
+        """
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    def close_all(self):
+        """Закрывает все открытые соединения"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Ошибка закрытия соединения с базой: {e}")
+        self._local = threading.local()
+
+
+class AsyncExecutorProxy:
+    """Асинхронный доступ к синхронному объекту через пул потоков.
+
+    Каждый метод target доступен как корутина, которая выполняется в
+    executor, и цикл событий бота не ждет диск. Хранилища одной базы
+    получают общий executor с одним потоком: записи в SQLite идут
+    последовательно, а соединение ConnectionManager у них одно.
+    Executor принадлежит создавшему его коду и останавливается им.
+    """
+
+    def __init__(self, target, executor):
+        self.target = target
+        self.executor = executor
+
+    def __getattr__(self, name):
+        method = getattr(self.target, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+        call.__name__ = name
+        return call
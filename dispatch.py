@@ -0,0 +1,107 @@
+import time
+import asyncio
+import logging
+
+from telegram.error import BadRequest, RetryAfter, TimedOut, NetworkError, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Итог одной попытки отправки
+SENT = 'sent'
+RETRY = 'retry'
+FAILED = 'failed'
+
+
+class TokenBucket:
+    """Ограничитель скорости: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds):
+        """Запрещает выдачу токенов на seconds секунд (после RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self):
+        """Корзина полная и не на паузе - ее можно выбросить"""
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RateLimitedSender:
+    """Параллельная отправка сообщений в рамках лимитов Telegram.
+
+    Общий лимит и лимит на чат соблюдаются корзинами токенов. При RetryAfter
+    вся отправка ставится на паузу на указанное Telegram время. Повторы
+    не делаются здесь: их с задержкой планирует очередь outbox по итогу
+    send_once.
+    """
+
+    # Сколько корзин чатов держать, прежде чем выбросить простаивающие
+    MAX_CHAT_BUCKETS = 1000
+
+    def __init__(self, global_rate=25, per_chat_rate=1, max_concurrency=10):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self._chat_buckets = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.MAX_CHAT_BUCKETS:
+                for idle in [key for key, value in self._chat_buckets.items() if value.is_idle()]:
+                    del self._chat_buckets[idle]
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate)
+        return bucket
+
+    async def send_once(self, bot, chat_id, text, **kwargs):
+        """Одна попытка отправки в пределах лимитов.
+
+        Возвращает (итог, задержка): SENT, FAILED или RETRY; для RETRY
+        задержка - время, которое просит выждать Telegram, или None.
+        """
+        chat_bucket = self._chat_bucket(chat_id)
+        async with self._semaphore:
+            await chat_bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                return SENT, None
+            except RetryAfter as e:
+                delay = float(e.retry_after)
+                # Telegram ограничивает весь бот, поэтому пауза общая
+                self.global_bucket.pause(delay)
+                logger.warning(f"RetryAfter при отправке в чат {chat_id}, пауза {delay} с")
+                return RETRY, delay
+            except BadRequest as e:
+                # BadRequest наследует NetworkError, но повтор тут не поможет
+                logger.error(f"Telegram отклонил сообщение в чат {chat_id}: {e}")
+                return FAILED, None
+            except (TimedOut, NetworkError) as e:
+                logger.warning(f"Сетевая ошибка при отправке в чат {chat_id}: {e}")
+                return RETRY, None
+            except TelegramError as e:
+                logger.error(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+                return FAILED, None
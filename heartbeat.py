@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import asyncio
+import logging
+
+from atomic_file import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+# Файл состояния бота рядом с bot.py и app.py
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'heartbeat.json')
+
+
+def read_heartbeat(path=DEFAULT_PATH):
+    """Последнее состояние бота из файла или None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def health_thresholds():
+    """Пороги проверок из .env: HEARTBEAT_MAX_AGE, HEALTH_MAX_LOOP_LAG,
+    HEALTH_MAX_DB_LATENCY (секунды) и HEALTH_MAX_OUTBOX_DEPTH (сообщений)"""
+    return {
+        'max_age': float(os.getenv('HEARTBEAT_MAX_AGE', 60)),
+        'max_loop_lag': float(os.getenv('HEALTH_MAX_LOOP_LAG', 5)),
+        'max_db_latency': float(os.getenv('HEALTH_MAX_DB_LATENCY', 2)),
+        'max_outbox_depth': int(os.getenv('HEALTH_MAX_OUTBOX_DEPTH', 500)),
+    }
+
+
+def check_health(heartbeat, now=None, thresholds=None):
+    """Оценивает состояние бота по heartbeat.
+
+    live - бот жив: состояние обновлялось не позже max_age секунд назад и
+    цикл событий не отстает больше чем на max_loop_lag. ready - бот жив,
+    база отвечает быстрее max_db_latency, а в очереди исходящих не больше
+    max_outbox_depth сообщений. problems - причины, по которым проверка
+    не пройдена.
+    """
+    thresholds = thresholds or health_thresholds()
+    now = now or time.time()
+    if not heartbeat:
+        return {'live': False, 'ready': False, 'problems': ['нет данных heartbeat']}
+
+    problems = []
+    age = now - heartbeat.get('written_at', 0)
+    if age > thresholds['max_age']:
+        problems.append(f"heartbeat не обновлялся {age:.0f} с")
+    if heartbeat.get('loop_lag', 0) > thresholds['max_loop_lag']:
+        problems.append(f"задержка цикла событий {heartbeat['loop_lag']:.1f} с")
+    live = not problems
+
+    db_latency = heartbeat.get('db_latency')
+    if db_latency is None:
+        problems.append("база данных не ответила")
+    elif db_latency > thresholds['max_db_latency']:
+        problems.append(f"ответ базы {db_latency:.2f} с")
+    outbox_depth = heartbeat.get('outbox_depth')
+    if outbox_depth is not None and outbox_depth > thresholds['max_outbox_depth']:
+        problems.append(f"в очереди сообщений {outbox_depth}")
+    return {'live': live, 'ready': not problems, 'problems': problems}
+
+
+class HeartbeatWriter:
+    """Периодически записывает состояние бота в файл для внешних проверок.
+
+    Раз в interval секунд собирает поля через collect() (корутина,
+    возвращающая dict) и добавляет к ним время записи и задержку цикла
+    событий - насколько позже назначенного проснулась задача. Файл
+    подменяется атомарно в потоке по умолчанию, последнее состояние
+    доступно в last.
+    """
+
+    def __init__(self, path, collect, interval=10):
+        self.path = path
+        self.collect = collect
+        self.interval = interval
+        self.started_at = time.time()
+        self.last = None
+        self._stop = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        lag = 0.0
+        while not self._stop.is_set():
+            try:
+                heartbeat = {
+                    'pid': os.getpid(),
+                    'started_at': self.started_at,
+                    'loop_lag': round(lag, 3),
+                    **await self.collect(),
+                    'written_at': time.time(),
+                }
+                self.last = heartbeat
+                await loop.run_in_executor(
+                    None, write_text_atomic, self.path, json.dumps(heartbeat, ensure_ascii=False)
+                )
+            except Exception as e:
+                logger.error(f"Ошибка записи heartbeat {self.path}: {e}")
+
+            expected = loop.time() + self.interval
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            lag = max(0.0, loop.time() - expected)
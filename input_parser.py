@@ -0,0 +1,106 @@
+import re
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+# Даты, которые вводят клиенты: 25.12, 25.12.2024, 25/12, 25-12-24
+NUMERIC_DATE_PATTERN = re.compile(r'(?<!\d)(\d{1,2})[./-](\d{1,2})(?:[./-](\d{4}|\d{2}))?(?!\d)')
+# 2024-12-25
+ISO_DATE_PATTERN = re.compile(r'(?<!\d)(\d{4})-(\d{1,2})-(\d{1,2})(?!\d)')
+# "25 декабря", "5 мая 2025"
+MONTH_DATE_PATTERN = re.compile(r'(?<!\d)(\d{1,2})\s+([а-яё]+)(?:\s+(\d{4}))?')
+# 15:30, 15.30, 9:00
+TIME_PATTERN = re.compile(r'(?<!\d)(\d{1,2})[:.](\d{2})(?!\d)')
+# Только час: "15", "в 15", "15 ч"
+HOUR_PATTERN = re.compile(r'^(?:в\s*)?(\d{1,2})(?:\s*(?:ч|час|часа|часов))?$')
+
+# Относительные дни в порядке проверки ("послезавтра" содержит "завтра")
+RELATIVE_DAYS = (('послезавтра', 2), ('завтра', 1), ('сегодня', 0))
+
+# Первые буквы названия месяца -> номер месяца
+MONTH_PREFIXES = {
+    'янв': 1, 'фев': 2, 'мар': 3, 'апр': 4, 'мая': 5, 'май': 5,
+    'июн': 6, 'июл': 7, 'авг': 8, 'сен': 9, 'окт': 10, 'ноя': 11, 'дек': 12,
+}
+
+# Названия и сокращения дней недели ("в пятницу", "пт") -> номер дня (понедельник = 0)
+WEEKDAYS = {
+    'пн': 0, 'понедельник': 0,
+    'вт': 1, 'вторник': 1,
+    'ср': 2, 'среда': 2, 'среду': 2,
+    'чт': 3, 'четверг': 3,
+    'пт': 4, 'пятница': 4, 'пятницу': 4,
+    'сб': 5, 'суббота': 5, 'субботу': 5,
+    'вс': 6, 'воскресенье': 6,
+}
+# Только целые слова: "понял" или "пятое" днями недели не считаются
+WEEKDAY_PATTERN = re.compile(r'(?<![а-яё])(' + '|'.join(sorted(WEEKDAYS, key=len, reverse=True)) + r')(?![а-яё])')
+
+def _with_year(day, month, year, today):
+    """Дата с указанным годом; без года - ближайшая будущая"""
+    if year is not None:
+        year = int(year)
+        if year < 100:
+            year += 2000
+        return date(year, month, day)
+    result = date(today.year, month, day)
+    if result < today:
+        result = date(today.year + 1, month, day)
+    return result
+
+
+@lru_cache(maxsize=512)
+def _parse_date(text, today):
+    for word, offset in RELATIVE_DAYS:
+        if word in text:
+            return today + timedelta(days=offset)
+
+    match = ISO_DATE_PATTERN.search(text)
+    if match:
+        return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+    match = NUMERIC_DATE_PATTERN.search(text)
+    if match:
+        return _with_year(int(match.group(1)), int(match.group(2)), match.group(3), today)
+
+    match = MONTH_DATE_PATTERN.search(text)
+    if match and match.group(2)[:3] in MONTH_PREFIXES:
+        return _with_year(int(match.group(1)), MONTH_PREFIXES[match.group(2)[:3]], match.group(3), today)
+
+    match = WEEKDAY_PATTERN.search(text)
+    if match:
+        weekday = WEEKDAYS[match.group(1)]
+        return today + timedelta(days=(weekday - today.weekday()) % 7)
+
+    # Редкие форматы разбираем dateutil; модуль загружается только здесь
+    from dateutil import parser
+    return parser.parse(text, dayfirst=True).date()
+
+
+def parse_date(text, today=None):
+    """Разбирает дату, введенную клиентом или взятую с кнопки.
+
+    Понимает ДД.ММ, ДД.ММ.ГГГГ, ДД/ММ, "25 декабря", дни недели и слова
+    "сегодня", "завтра", "послезавтра". Результат кэшируется вместе с
+    текущей датой, от которой считаются относительные дни.
+    Бросает ValueError, если дату разобрать не удалось.
+    """
+    return _parse_date(text.strip().lower(), today or datetime.now().date())
+
+
+@lru_cache(maxsize=256)
+def _parse_time(text):
+    match = TIME_PATTERN.search(text)
+    if match:
+        return time(int(match.group(1)), int(match.group(2)))
+    match = HOUR_PATTERN.match(text)
+    if match:
+        return time(int(match.group(1)))
+    raise ValueError(f"Не удалось разобрать время: {text}")
+
+
+def parse_time(text):
+    """Разбирает время: ЧЧ:ММ, ЧЧ.ММ или ЧЧ (в том числе с кнопки "🕘 09:00").
+
+    Бросает ValueError, если время разобрать не удалось.
+    """
+    return _parse_time(text.strip().lower())
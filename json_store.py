@@ -0,0 +1,151 @@
+import os
+import json
+import logging
+import threading
+
+from atomic_file import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+def _read_records(path):
+    """Читает записи из JSON-массива или из JSON Lines.
+
+    Недописанная строка (например, после сбоя посреди записи журнала)
+    пропускается с предупреждением.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    if not content:
+        return []
+    if content.startswith('['):
+        return json.loads(content)
+
+    records = []
+    for number, line in enumerate(content.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            logger.warning(f"Пропущена поврежденная строка {number} в {path}")
+    return records
+
+
+def _write_atomic(path, records):
+    """Записывает JSON Lines во временный файл и атомарно подменяет им path"""
+    with atomic_write(path, fsync=True) as f:
+        for record in records:
+            json.dump(record, f, ensure_ascii=False)
+            f.write('\n')
+
+
+class BookingJournal:
+    """JSON-копия базы записей: снимок и журнал изменений.
+
+    Снимок (bookings.json) - все записи в JSON Lines, журнал
+    (bookings.json.log) - дописываемые строки с изменениями записей:
+    новая запись целиком или только измененные поля с номером записи.
+    Изменение записи стоит одной строки в журнале, а не перезаписи всего
+    файла. Журнал время от времени сворачивается в снимок (compact);
+    снимок всегда подменяется атомарно, поэтому сбой не обрезает его.
+    """
+
+    def __init__(self, path, compact_threshold=500):
+        self.path = path
+        self.log_path = f"{path}.log"
+        # Журнал, который сейчас сворачивается в снимок
+        self.compacting_path = f"{path}.log.compacting"
+        self.compact_threshold = compact_threshold
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+
+    @property
+    def dirty(self):
+        """В журнале есть изменения, которых нет в снимке"""
+        return self._pending > 0 or os.path.exists(self.compacting_path)
+
+    @property
+    def needs_compaction(self):
+        return self._pending >= self.compact_threshold
+
+    def append(self, records):
+        """Дописывает изменения в журнал. records - словари с полем id"""
+        if not records:
+            return
+        with self._lock:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    json.dump(record, f, ensure_ascii=False)
+                    f.write('\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending += len(records)
+
+    @staticmethod
+    def _apply(bookings, records):
+        for record in records:
+            if record.get('id') is None:
+                continue
+            bookings.setdefault(record['id'], {}).update(record)
+
+    def _read_snapshot(self):
+        """Снимок в виде (записи без номера, {id: запись})"""
+        anonymous, bookings = [], {}
+        for booking in _read_records(self.path):
+            # В старых файлах номер записи мог отсутствовать
+            if booking.get('id') is None:
+                anonymous.append(booking)
+            else:
+                bookings[booking['id']] = booking
+        return anonymous, bookings
+
+    def load(self):
+        """Записи из снимка с примененным журналом"""
+        anonymous, bookings = self._read_snapshot()
+        self._apply(bookings, _read_records(self.compacting_path))
+        self._apply(bookings, _read_records(self.log_path))
+        return anonymous + list(bookings.values())
+
+    def write_snapshot(self, bookings):
+        """Записывает полный снимок и очищает журнал"""
+        with self._compact_lock, self._lock:
+            _write_atomic(self.path, bookings)
+            for path in (self.compacting_path, self.log_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._pending = 0
+
+    def compact(self):
+        """Сворачивает журнал в снимок. Возвращает число примененных изменений.
+
+        Под блокировкой журнал только переименовывается, поэтому новые
+        изменения дописываются в свежий журнал, пока снимок пересобирается.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if os.path.exists(self.log_path):
+                    if os.path.exists(self.compacting_path):
+                        # Остаток прерванного сжатия: дописываем к нему новый журнал
+                        with open(self.log_path, 'r', encoding='utf-8') as src, \
+                                open(self.compacting_path, 'a', encoding='utf-8') as dst:
+                            dst.write(src.read())
+                            dst.flush()
+                            os.fsync(dst.fileno())
+                        os.remove(self.log_path)
+                    else:
+                        os.replace(self.log_path, self.compacting_path)
+                self._pending = 0
+            if not os.path.exists(self.compacting_path):
+                return 0
+
+            records = _read_records(self.compacting_path)
+            anonymous, bookings = self._read_snapshot()
+            self._apply(bookings, records)
+            _write_atomic(self.path, anonymous + sorted(bookings.values(), key=lambda booking: booking['id']))
+            os.remove(self.compacting_path)
+            logger.info(f"Журнал записей свернут в {self.path}: изменений {len(records)}")
+            return len(records)
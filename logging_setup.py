@@ -0,0 +1,90 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись лога - один JSON-объект в строке"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _parse_levels(value):
+    """'httpx=WARNING,telegram=INFO' -> {'httpx': 'WARNING', 'telegram': 'INFO'}"""
+    levels = {}
+    for item in (value or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _file_handler(path):
+    if os.getenv('LOG_ROTATE', 'size') == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            path,
+            when=os.getenv('LOG_ROTATE_WHEN', 'midnight'),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', 7)),
+            encoding='utf-8',
+        )
+    return logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=int(os.getenv('LOG_MAX_BYTES', 5 * 1024 * 1024)),
+        backupCount=int(os.getenv('LOG_BACKUP_COUNT', 7)),
+        encoding='utf-8',
+    )
+
+
+def setup_logging(log_file='bot.log'):
+    """Настраивает логирование через очередь.
+
+    Обработчики бота только кладут записи в очередь; в файл с ротацией и в
+    консоль их пишет отдельный поток QueueListener, поэтому цикл событий
+    не ждет диск. Настройки из .env: LOG_LEVEL, LOG_LEVELS (уровни
+    отдельных логгеров), LOG_FORMAT (text или json), LOG_FILE, LOG_ROTATE
+    (size или time), LOG_MAX_BYTES, LOG_ROTATE_WHEN, LOG_BACKUP_COUNT.
+    Возвращает запущенный QueueListener.
+    """
+    if os.getenv('LOG_FORMAT', 'text') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    # Относительный путь считается от папки бота, а не от текущей папки процесса
+    log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv('LOG_FILE') or log_file)
+    handlers = [_file_handler(log_path), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+    # httpx пишет в INFO каждый запрос к Telegram API, включая getUpdates
+    for name, level in _parse_levels(os.getenv('LOG_LEVELS', 'httpx=WARNING')).items():
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    # Дописываем оставшиеся в очереди записи при выходе
+    atexit.register(listener.stop)
+    return listener
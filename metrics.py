@@ -0,0 +1,189 @@
+import os
+import time
+import bisect
+import functools
+
+from telegram.ext import ApplicationHandlerStop, ConversationHandler, JobQueue
+
+# Файл с последними метриками бота, который отдает app.py на /metrics
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics.prom')
+
+# Границы корзин гистограмм длительности, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class MetricsRegistry:
+    """Счетчики, гистограммы и датчики в текстовом формате Prometheus.
+
+    Метки передаются кортежем пар ((имя, значение), ...). Наблюдение - это
+    поиск корзины bisect и пара сложений в словаре, без блокировок: все
+    обращения идут из цикла событий бота. Датчики (gauge) не хранятся, а
+    собираются при выводе функциями из add_collector.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # имя -> (тип, описание) в порядке регистрации
+        self._described = {}
+        # (имя, метки) -> значение
+        self._counters = {}
+        # (имя, метки) -> [счетчики по корзинам (последняя - +Inf), сумма, количество]
+        self._histograms = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        self._described[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def add_collector(self, collect):
+        """collect() возвращает значения датчиков: [(имя, метки, значение), ...]"""
+        self._collectors.append(collect)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        samples = {}
+        for (name, labels), value in self._counters.items():
+            samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in self._histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                if value is not None:
+                    samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+
+        output = []
+        for name, (kind, help_text) in self._described.items():
+            if name not in samples:
+                continue
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(samples[name])
+        return '\n'.join(output) + '\n'
+
+    def wrap_handler(self, callback, state=''):
+        """Обертка обработчика: длительность и ошибки по обработчику и состоянию диалога"""
+        if getattr(callback, 'instrumented', False):
+            return callback
+        labels = (('handler', callback.__name__), ('state', state))
+
+        @functools.wraps(callback)
+        async def instrumented(update, context):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except ApplicationHandlerStop:
+                raise
+            except Exception:
+                self.inc('bot_handler_errors_total', labels)
+                raise
+            finally:
+                self.observe('bot_handler_duration_seconds', labels, time.perf_counter() - started)
+
+        instrumented.instrumented = True
+        return instrumented
+
+    def wrap_job(self, callback):
+        """Обертка задачи job_queue: длительность и ошибки по функции задачи"""
+        if getattr(callback, 'instrumented', False):
+            return callback
+        labels = (('job', callback.__qualname__),)
+
+        @functools.wraps(callback)
+        async def instrumented(context):
+            started = time.perf_counter()
+            try:
+                return await callback(context)
+            except Exception:
+                self.inc('bot_job_errors_total', labels)
+                raise
+            finally:
+                self.observe('bot_job_duration_seconds', labels, time.perf_counter() - started)
+
+        instrumented.instrumented = True
+        return instrumented
+
+
+def describe_bot_metrics(registry):
+    """Описания метрик обработчиков, задач и запросов к Telegram API"""
+    registry.describe('bot_handler_duration_seconds', 'histogram', 'Время обработчика обновления')
+    registry.describe('bot_handler_errors_total', 'counter', 'Исключения в обработчиках')
+    registry.describe('bot_job_duration_seconds', 'histogram', 'Время задачи job_queue')
+    registry.describe('bot_job_errors_total', 'counter', 'Исключения в задачах job_queue')
+    registry.describe('telegram_api_request_duration_seconds', 'histogram', 'Время запроса к Telegram API')
+    registry.describe('telegram_api_requests_total', 'counter', 'Запросы к Telegram API по коду ответа')
+
+
+def instrument_handlers(application, registry, state_names=None):
+    """Оборачивает обработчики приложения, включая вложенные в ConversationHandler.
+
+    Состояние диалога в метках - имя из state_names, 'entry' для точек
+    входа, 'fallback' для запасных обработчиков и пустая строка вне диалога.
+    """
+    state_names = state_names or {}
+
+    def instrument(handler, state):
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points:
+                instrument(inner, 'entry')
+            for conversation_state, inner_handlers in handler.states.items():
+                for inner in inner_handlers:
+                    instrument(inner, state_names.get(conversation_state, str(conversation_state)))
+            for inner in handler.fallbacks:
+                instrument(inner, 'fallback')
+        elif callable(getattr(handler, 'callback', None)):
+            handler.callback = registry.wrap_handler(handler.callback, state)
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            instrument(handler, '')
+
+
+class InstrumentedJobQueue(JobQueue):
+    """JobQueue, который оборачивает функции всех задач через MetricsRegistry.wrap_job"""
+
+    def __init__(self, registry):
+        super().__init__()
+        self.registry = registry
+
+    def run_once(self, callback, *args, **kwargs):
+        return super().run_once(self.registry.wrap_job(callback), *args, **kwargs)
+
+    def run_repeating(self, callback, *args, **kwargs):
+        return super().run_repeating(self.registry.wrap_job(callback), *args, **kwargs)
+
+    def run_daily(self, callback, *args, **kwargs):
+        return super().run_daily(self.registry.wrap_job(callback), *args, **kwargs)
+
+    def run_monthly(self, callback, *args, **kwargs):
+        return super().run_monthly(self.registry.wrap_job(callback), *args, **kwargs)
+
+    def run_custom(self, callback, *args, **kwargs):
+        return super().run_custom(self.registry.wrap_job(callback), *args, **kwargs)
@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime, timedelta
+
+from outbox import LANE_ADMIN
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_pairs(value):
+    """'a=1,2;b=3' -> [('a', ['1', '2']), ('b', ['3'])]"""
+    pairs = []
+    for item in (value or '').split(';'):
+        key, _, values = item.partition('=')
+        values = [part.strip() for part in values.split(',') if part.strip()]
+        if key.strip() and values:
+            pairs.append((key.strip(), values))
+    return pairs
+
+
+def parse_admin_routes(value, services):
+    """Разбирает таблицу "услуга -> администраторы" из строки .env.
+
+    Формат: manicure,pedicure=1373071419;epilation=1094720117,130208292 -
+    ключи услуг из services (ключ -> название) и ID администраторов через
+    запятую. Возвращает {название услуги: {ID администраторов}}.
+    """
+    routes = {}
+    for keys, admin_ids in _parse_pairs(value):
+        for key in keys.split(','):
+            key = key.strip()
+            if key not in services:
+                logger.warning(f"ADMIN_ROUTES: неизвестная услуга '{key}'")
+                continue
+            routes.setdefault(services[key], set()).update(int(admin_id) for admin_id in admin_ids)
+    return routes
+
+
+def parse_admin_digest(value):
+    """'130208292=60;1094720117=30' -> {130208292: 60, 1094720117: 30} (минуты между сводками)"""
+    return {int(admin_id): int(minutes[0]) for admin_id, minutes in _parse_pairs(value)}
+
+
+class AdminNotifier:
+    """Уведомления администраторов о новых записях.
+
+    Получатели берутся из таблицы routes (название услуги -> ID
+    администраторов) и списка always, которому уходят все записи.
+    Уведомления ставятся в очередь outbox одной транзакцией и рассылаются
+    параллельно ее фоновой отправкой. Администратор из digest_minutes
+    получает несрочные записи (начало позже чем через urgent_hours) одной
+    сводкой раз в заданное число минут; срочные приходят сразу.
+    """
+
+    def __init__(self, outbox, renderer, routes, always=(), digest_minutes=None, urgent_hours=24):
+        self.outbox = outbox
+        self.renderer = renderer
+        self.routes = routes
+        self.always = set(always)
+        # ID администратора -> минуты между сводками
+        self.digest_minutes = digest_minutes or {}
+        self.urgent_hours = urgent_hours
+
+    def recipients(self, service):
+        """Администраторы, которым уходит запись на услугу"""
+        return self.routes.get(service, set()) | self.always
+
+    def is_urgent(self, booking, now=None):
+        """Запись скоро начнется - о ней сообщается сразу, без сводки"""
+        if booking.get('start_ts') is None:
+            return True
+        start = datetime.fromtimestamp(booking['start_ts'])
+        return start - (now or datetime.now()) <= timedelta(hours=self.urgent_hours)
+
+    async def notify_new_booking(self, booking, now=None):
+        """Ставит уведомления о новой записи в очередь или в сводки"""
+        admin_ids = self.recipients(booking['service'])
+        urgent = self.is_urgent(booking, now)
+        immediate = sorted(admin_id for admin_id in admin_ids if urgent or admin_id not in self.digest_minutes)
+        held = sorted(admin_ids - set(immediate))
+
+        if immediate:
+            text = self.renderer.admin_notification(booking)
+            await self.outbox.put_many(LANE_ADMIN, [
+                {
+                    'chat_id': admin_id,
+                    'text': text,
+                    'parse_mode': 'Markdown',
+                    'disable_web_page_preview': True,
+                    'dedupe_key': f"admin:{booking['id']}:{admin_id}",
+                }
+                for admin_id in immediate
+            ])
+        if held:
+            line = self.renderer.admin_digest_item(booking)
+            await self.outbox.hold_many([
+                {'chat_id': admin_id, 'line': line, 'dedupe_key': f"admin:{booking['id']}:{admin_id}"}
+                for admin_id in held
+            ])
+        logger.info(
+            f"Уведомление о записи #{booking['id']}: сразу {len(immediate)} администраторам, в сводку {len(held)}"
+        )
+
+    def schedule_digests(self, job_queue):
+        """Ставит периодическую отправку сводок"""
+        for admin_id, minutes in self.digest_minutes.items():
+            job_queue.run_repeating(
+                self._flush_digest, interval=minutes * 60, first=minutes * 60,
+                data=admin_id, name=f"admin_digest:{admin_id}"
+            )
+
+    async def _flush_digest(self, context):
+        admin_id = context.job.data
+        try:
+            count = await self.outbox.flush_digest(
+                admin_id, self.renderer.admin_digest, parse_mode='Markdown', disable_web_page_preview=True
+            )
+            if count:
+                logger.info(f"Сводка из {count} записей поставлена в очередь для администратора {admin_id}")
+        except Exception as e:
+            logger.error(f"Ошибка отправки сводки администратору {admin_id}: {e}")
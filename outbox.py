@@ -0,0 +1,298 @@
+import json
+import time
+import asyncio
+import logging
+
+from dispatch import SENT, RETRY
+
+logger = logging.getLogger(__name__)
+
+# Полосы очереди в порядке приоритета: меньшее число отправляется раньше
+LANE_INTERACTIVE = 0
+LANE_ADMIN = 1
+LANE_BULK = 2
+
+
+class OutboxStore:
+    """Очередь исходящих сообщений в таблице outbox той же базы SQLite.
+
+    Сообщение хранится до отправки: после перезапуска бота неотправленные
+    сообщения отправляются заново. Ключ дедупликации (dedupe_key) уникален,
+    поэтому повторная постановка того же уведомления или напоминания
+    игнорируется. Отправленные сообщения остаются в таблице, чтобы ключи
+    продолжали защищать от повторов, пока их не удалит prune.
+    """
+
+    def __init__(self, connections):
+        # Менеджер соединений (db.ConnectionManager)
+        self.connections = connections
+
+    def init_schema(self):
+        """Создает таблицу очереди, если ее еще нет"""
+        with self.connections.transaction() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                lane INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                options TEXT NOT NULL DEFAULT '{}',
+                dedupe_key TEXT UNIQUE,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_ts REAL NOT NULL,
+                created_ts REAL NOT NULL,
+                sent_ts REAL
+            )
+            ''')
+            # Выборка очередной пачки идет только по неотправленным сообщениям
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (lane, next_attempt_ts) "
+                "WHERE status = 'pending'"
+            )
+            # Строки сводок, которые копятся до отправки одним сообщением
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_digest (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                line TEXT NOT NULL,
+                dedupe_key TEXT UNIQUE,
+                created_ts REAL NOT NULL
+            )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_digest_chat ON outbox_digest (chat_id, id)')
+
+    def enqueue(self, lane, messages, now=None):
+        """Ставит сообщения в очередь. Возвращает число новых сообщений.
+
+        messages - словари с chat_id, text, необязательным dedupe_key и
+        остальными аргументами send_message (parse_mode и т.п.).
+        """
+        now = now or time.time()
+        rows = []
+        for message in messages:
+            options = dict(message)
+            chat_id = options.pop('chat_id')
+            text = options.pop('text')
+            dedupe_key = options.pop('dedupe_key', None)
+            rows.append((lane, chat_id, text, json.dumps(options, ensure_ascii=False), dedupe_key, now, now))
+        with self.connections.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO outbox "
+                "(lane, chat_id, text, options, dedupe_key, next_attempt_ts, created_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            return conn.total_changes - before
+
+    def hold(self, items, now=None):
+        """Откладывает строки сводки. items - словари с chat_id, line и dedupe_key"""
+        now = now or time.time()
+        with self.connections.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO outbox_digest (chat_id, line, dedupe_key, created_ts) VALUES (?, ?, ?, ?)",
+                [(item['chat_id'], item['line'], item.get('dedupe_key'), now) for item in items]
+            )
+            return conn.total_changes - before
+
+    def flush_digest(self, chat_id, render, lane, options, now=None):
+        """Собирает отложенные строки чата в одно сообщение очереди.
+
+        render(lines) возвращает текст сводки. Выборка строк, постановка
+        сводки в очередь и удаление строк идут одной транзакцией, поэтому
+        сбой не теряет и не дублирует строки. Возвращает число строк.
+        """
+        now = now or time.time()
+        with self.connections.transaction(immediate=True) as conn:
+            rows = conn.execute(
+                "SELECT id, line FROM outbox_digest WHERE chat_id = ? ORDER BY id", (chat_id,)
+            ).fetchall()
+            if not rows:
+                return 0
+            last_id = rows[-1]['id']
+            conn.execute(
+                "INSERT OR IGNORE INTO outbox "
+                "(lane, chat_id, text, options, dedupe_key, next_attempt_ts, created_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (lane, chat_id, render([row['line'] for row in rows]), json.dumps(options, ensure_ascii=False),
+                 f"digest:{chat_id}:{last_id}", now, now)
+            )
+            conn.execute("DELETE FROM outbox_digest WHERE chat_id = ? AND id <= ?", (chat_id, last_id))
+            return len(rows)
+
+    def due(self, now, limit):
+        """Сообщения, которые пора отправить: сначала по полосе, затем по времени"""
+        rows = self.connections.connection().execute(
+            "SELECT id, lane, chat_id, text, options, attempts FROM outbox "
+            "WHERE status = 'pending' AND next_attempt_ts <= ? "
+            "ORDER BY lane, next_attempt_ts LIMIT ?",
+            (now, limit)
+        ).fetchall()
+        messages = []
+        for row in rows:
+            message = dict(row)
+            message['options'] = json.loads(message['options'])
+            messages.append(message)
+        return messages
+
+    def next_attempt_ts(self):
+        """Время ближайшей попытки отправки или None, если очередь пуста"""
+        row = self.connections.connection().execute(
+            "SELECT MIN(next_attempt_ts) FROM outbox WHERE status = 'pending'"
+        ).fetchone()
+        return row[0]
+
+    def pending_count(self):
+        """Число неотправленных сообщений"""
+        return self.connections.connection().execute(
+            "SELECT COUNT(*) FROM outbox WHERE status = 'pending'"
+        ).fetchone()[0]
+
+    def record(self, sent, retries, failed, now=None):
+        """Записывает итоги пачки одной транзакцией.
+
+        sent и failed - номера сообщений, retries - пары (номер, время следующей попытки).
+        """
+        now = now or time.time()
+        with self.connections.transaction() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_ts = ? WHERE id = ?",
+                [(now, message_id) for message_id in sent]
+            )
+            conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt_ts = ? WHERE id = ?",
+                [(next_ts, message_id) for message_id, next_ts in retries]
+            )
+            conn.executemany(
+                "UPDATE outbox SET status = 'failed', attempts = attempts + 1 WHERE id = ?",
+                [(message_id,) for message_id in failed]
+            )
+
+    def prune(self, before_ts):
+        """Удаляет отправленные и неотправляемые сообщения старше before_ts"""
+        with self.connections.transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM outbox WHERE status != 'pending' AND created_ts < ?", (before_ts,)
+            )
+            return cursor.rowcount
+
+
+class Outbox:
+    """Постановка сообщений в очередь и фоновая отправка.
+
+    Фоновая задача берет из базы пачку готовых к отправке сообщений -
+    сначала полосу LANE_INTERACTIVE, затем уведомления администраторов
+    (LANE_ADMIN), затем массовые напоминания (LANE_BULK) - и отправляет ее
+    через RateLimitedSender в пределах лимитов Telegram. Пачка не больше
+    batch_size, поэтому новое сообщение более важной полосы ждет не дольше
+    одной пачки. При сетевой ошибке или RetryAfter сообщение откладывается с
+    экспоненциальной задержкой, после max_attempts попыток помечается как
+    неотправленное. Ответы клиенту в обработчиках идут напрямую, минуя
+    очередь, поэтому напоминания их не задерживают.
+    """
+
+    def __init__(self, store, sender, batch_size=10, max_attempts=8,
+                 retry_seconds=5, max_retry_seconds=900, poll_seconds=30):
+        # Асинхронная обертка над OutboxStore (db.AsyncExecutorProxy)
+        self.store = store
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.poll_seconds = poll_seconds
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    async def put(self, lane, chat_id, text, dedupe_key=None, **kwargs):
+        """Ставит одно сообщение в очередь. Возвращает True, если оно новое"""
+        return await self.put_many(lane, [dict(kwargs, chat_id=chat_id, text=text, dedupe_key=dedupe_key)]) > 0
+
+    async def put_many(self, lane, messages):
+        """Ставит пачку сообщений в очередь одной транзакцией и будит отправку"""
+        if not messages:
+            return 0
+        added = await self.store.enqueue(lane, messages)
+        if added:
+            self._wakeup.set()
+        return added
+
+    async def hold_many(self, items):
+        """Откладывает строки до сводки (см. flush_digest)"""
+        if not items:
+            return 0
+        return await self.store.hold(items)
+
+    async def flush_digest(self, chat_id, render, lane=LANE_ADMIN, **options):
+        """Ставит в очередь сводку из отложенных для чата строк"""
+        count = await self.store.flush_digest(chat_id, render, lane, options)
+        if count:
+            self._wakeup.set()
+        return count
+
+    def retry_delay(self, attempts):
+        """Задержка перед следующей попыткой после attempts неудачных"""
+        return min(self.retry_seconds * 2 ** (attempts - 1), self.max_retry_seconds)
+
+    def start(self, bot):
+        """Запускает фоновую отправку (из post_init приложения)"""
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self, timeout=10):
+        """Останавливает отправку, дав текущей пачке завершиться"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Отправка очереди сообщений прервана при остановке")
+        self._task = None
+
+    async def _run(self, bot):
+        logger.info("Отправка очереди сообщений запущена")
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                messages = await self.store.due(time.time(), self.batch_size)
+                if messages:
+                    await self._deliver(bot, messages)
+                    continue
+                next_ts = await self.store.next_attempt_ts()
+            except Exception as e:
+                logger.error(f"Ошибка очереди сообщений: {e}")
+                next_ts = None
+
+            timeout = self.poll_seconds
+            if next_ts is not None:
+                timeout = min(max(next_ts - time.time(), 0), self.poll_seconds)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, bot, messages):
+        results = await asyncio.gather(*(
+            self.sender.send_once(bot, message['chat_id'], message['text'], **message['options'])
+            for message in messages
+        ))
+
+        now = time.time()
+        sent, retries, failed = [], [], []
+        for message, (outcome, delay) in zip(messages, results):
+            attempts = message['attempts'] + 1
+            if outcome == SENT:
+                sent.append(message['id'])
+            elif outcome == RETRY and attempts < self.max_attempts:
+                retries.append((message['id'], now + max(delay or 0, self.retry_delay(attempts))))
+            else:
+                failed.append(message['id'])
+                logger.error(
+                    f"Сообщение #{message['id']} в чат {message['chat_id']} не отправлено, попыток: {attempts}"
+                )
+        await self.store.record(sent, retries, failed, now)
@@ -0,0 +1,153 @@
+import logging
+from datetime import datetime, timedelta
+
+from outbox import LANE_BULK
+
+logger = logging.getLogger(__name__)
+
+# За сколько до начала процедуры отправляется каждое напоминание
+REMINDER_OFFSETS = {
+    'day': timedelta(days=1),
+    'hour': timedelta(hours=1),
+}
+
+
+class ReminderScheduler:
+    """Планировщик напоминаний на точное время.
+
+    Вместо периодического опроса всех записей напоминания ставятся задачами
+    job_queue.run_once. Напоминания с одной и той же минутой отправки
+    собираются в одну пачку: она ставится в очередь outbox в полосу
+    массовых сообщений одной транзакцией, отметки об отправке тоже пишутся
+    одной транзакцией. Ключ reminder:<номер>:<вид> не дает отправить одно
+    напоминание дважды.
+    Задачи ставятся при старте бота и при подтверждении записи, снимаются
+    при отмене.
+    """
+
+    def __init__(self, job_queue, db, outbox, render_reminder, offsets=REMINDER_OFFSETS):
+        self.job_queue = job_queue
+        # Асинхронное хранилище записей (BookingRepository через db.AsyncExecutorProxy)
+        self.db = db
+        # Очередь исходящих сообщений (outbox.Outbox)
+        self.outbox = outbox
+        # render_reminder(booking, kind) возвращает текст напоминания
+        self.render_reminder = render_reminder
+        self.offsets = offsets
+        # Минута отправки (секунды Unix) -> {'job': задача, 'items': {(booking_id, kind)}}
+        self._batches = {}
+        # booking_id -> {(минута отправки, kind)}
+        self._booking_items = {}
+        # Время последнего запуска пачки (секунды Unix) для heartbeat
+        self.last_run = None
+
+    def _should_send(self, booking, kind, now):
+        """Нужно ли еще отправлять напоминание этого вида"""
+        if booking.get('status') != 'confirmed' or booking.get(f'reminder_sent_{kind}'):
+            return False
+        start = datetime.fromtimestamp(booking['start_ts'])
+        if start <= now:
+            return False
+
+        # Если уже подошло время более позднего напоминания, раннее не шлем
+        offset = self.offsets[kind]
+        for other_offset in self.offsets.values():
+            if other_offset < offset and now >= start - other_offset:
+                return False
+
+        # Напоминание за день говорит "завтра", поэтому с опозданием его шлем только накануне
+        if kind == 'day' and now >= start - offset and start.date() != (now + timedelta(days=1)).date():
+            return False
+        return True
+
+    def _add_to_batch(self, fire_at, item, now):
+        key = int(fire_at.replace(second=0, microsecond=0).timestamp())
+        batch = self._batches.get(key)
+        if batch is None:
+            when = 0 if fire_at <= now else datetime.fromtimestamp(key).astimezone()
+            # Задачи ставятся до запуска job_queue: без misfire_grace_time=None
+            # APScheduler молча пропустил бы уже наступившие, если старт дольше секунды
+            job = self.job_queue.run_once(
+                self._run, when, data=key, name=f"reminders:{key}",
+                job_kwargs={'misfire_grace_time': None}
+            )
+            batch = self._batches[key] = {'job': job, 'items': set()}
+        batch['items'].add(item)
+        self._booking_items.setdefault(item[0], set()).add((key, item[1]))
+
+    def schedule_booking(self, booking, now=None):
+        """Ставит напоминания для записи"""
+        if booking.get('start_ts') is None:
+            return 0
+
+        now = now or datetime.now()
+        self.unschedule_booking(booking['id'])
+        start = datetime.fromtimestamp(booking['start_ts'])
+        scheduled = 0
+        for kind, offset in self.offsets.items():
+            if not self._should_send(booking, kind, now):
+                continue
+            self._add_to_batch(max(start - offset, now), (booking['id'], kind), now)
+            scheduled += 1
+        return scheduled
+
+    def unschedule_booking(self, booking_id):
+        """Снимает напоминания записи"""
+        for key, kind in self._booking_items.pop(booking_id, set()):
+            batch = self._batches.get(key)
+            if not batch:
+                continue
+            batch['items'].discard((booking_id, kind))
+            if not batch['items']:
+                batch['job'].schedule_removal()
+                del self._batches[key]
+
+    def schedule_pending(self, bookings, now=None):
+        """Ставит напоминания для будущих подтвержденных записей (при старте)"""
+        now = now or datetime.now()
+        scheduled = 0
+        for booking in bookings:
+            scheduled += self.schedule_booking(booking, now)
+        logger.info(f"Запланировано напоминаний: {scheduled} в {len(self._batches)} пачках")
+        return scheduled
+
+    async def _run(self, context):
+        key = context.job.data
+        self.last_run = datetime.now().timestamp()
+        batch = self._batches.pop(key, None)
+        if not batch:
+            return
+
+        items = sorted(batch['items'])
+        for booking_id, kind in items:
+            booking_items = self._booking_items.get(booking_id)
+            if booking_items is not None:
+                booking_items.discard((key, kind))
+                if not booking_items:
+                    del self._booking_items[booking_id]
+
+        try:
+            # Перечитываем записи: их могли отменить или уже отправить напоминание
+            bookings = await self.db.get_many([booking_id for booking_id, _ in items])
+            now = datetime.now()
+            due = [
+                (bookings[booking_id], kind) for booking_id, kind in items
+                if booking_id in bookings and self._should_send(bookings[booking_id], kind, now)
+            ]
+            if not due:
+                return
+
+            queued = await self.outbox.put_many(LANE_BULK, [
+                {
+                    'chat_id': booking['chat_id'],
+                    'text': self.render_reminder(booking, kind),
+                    'parse_mode': 'Markdown',
+                    'dedupe_key': f"reminder:{booking['id']}:{kind}",
+                }
+                for booking, kind in due
+            ])
+            # Напоминание в очереди будет отправлено и после перезапуска
+            await self.db.mark_reminders_sent([(booking['id'], kind) for booking, kind in due])
+            logger.info(f"Поставлено в очередь напоминаний: {queued} из {len(due)}")
+        except Exception as e:
+            logger.error(f"Ошибка отправки пачки напоминаний: {e}")
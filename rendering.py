@@ -0,0 +1,278 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from telegram import ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton
+from telegram.helpers import escape_markdown
+
+# ==================== КЛАВИАТУРЫ ====================
+# Объекты разметки PTB неизменяемы, поэтому статические клавиатуры строятся
+# один раз при импорте и переиспользуются во всех ответах.
+
+# Услуги в порядке кнопок: callback_data -> название
+SERVICE_CALLBACKS = {
+    'epilation': '🧖 Лазерная эпиляция',
+    'tanning': '☀️ Моментальный загар',
+    'manicure': '💅 Маникюр',
+    'pedicure': '👣 Педикюр',
+    'makeup': '💄 Визажист',
+    'lashes': '👁️ Ресницы',
+}
+
+# Кнопки, с которых начинается запись
+BOOKING_BUTTONS = ("💅 Записаться на процедуру", "💅 Новая запись")
+
+MAIN_MENU_KEYBOARD = ReplyKeyboardMarkup([
+    ["💅 Записаться на процедуру"],
+    ["📊 Мои записи", "ℹ️ О студии"],
+    ["📞 Контакты", "🔄 Главное меню"]
+], resize_keyboard=True)
+
+SERVICE_KEYBOARD = InlineKeyboardMarkup(
+    [[InlineKeyboardButton(name, callback_data=key)] for key, name in SERVICE_CALLBACKS.items()]
+    + [[InlineKeyboardButton("🔙 Назад", callback_data='back')]]
+)
+
+CONTACTS_KEYBOARD = ReplyKeyboardMarkup([
+    ["📞 Поделиться контактом"],
+    ["🔙 Назад к выбору времени"]
+], resize_keyboard=True)
+
+SHARE_CONTACT_KEYBOARD = ReplyKeyboardMarkup(
+    [[KeyboardButton("📞 Поделиться контактом", request_contact=True)]], resize_keyboard=True
+)
+
+CONFIRM_KEYBOARD = ReplyKeyboardMarkup([["✅ Да, подтверждаю", "❌ Нет, отменить"]], resize_keyboard=True)
+
+SUCCESS_KEYBOARD = ReplyKeyboardMarkup([
+    ["💅 Новая запись", "📊 Мои записи"],
+    ["📞 Контакты", "🔄 Главное меню"]
+], resize_keyboard=True)
+
+NO_BOOKINGS_KEYBOARD = ReplyKeyboardMarkup(
+    [["💅 Записаться на процедуру"], ["🔄 Главное меню"]], resize_keyboard=True
+)
+
+# Эмодзи часов для кнопок со временем
+CLOCK_EMOJI = {
+    0: "🕛", 1: "🕐", 2: "🕑", 3: "🕒", 4: "🕓", 5: "🕔",
+    6: "🕕", 7: "🕖", 8: "🕗", 9: "🕘", 10: "🕙", 11: "🕚"
+}
+
+
+@lru_cache(maxsize=256)
+def time_keyboard(slots):
+    """Клавиатура выбора времени для кортежа свободных слотов (datetime.time).
+
+    Наборов свободного времени немного, поэтому клавиатуры кэшируются.
+    """
+    buttons = [f"{CLOCK_EMOJI[slot.hour % 12]} {slot.strftime('%H:%M')}" for slot in slots]
+    buttons.append("🕗 Другое время")
+    keyboard = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    keyboard.append(["🔙 Назад к выбору даты"])
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+
+# ==================== ШАБЛОНЫ ====================
+
+# Статус записи: (эмодзи, текст)
+STATUS_LABELS = {
+    'pending': ('⏳', 'Ожидает подтверждения'),
+    'confirmed': ('✅', 'Подтверждена'),
+    'cancelled': ('❌', 'Отменена'),
+}
+
+BOOKING_CARD = (
+    "💅 *Услуга:* {service}\n"
+    "📅 *Дата и время:* {date}\n"
+    "⏰ *Продолжительность:* {duration} мин.\n"
+)
+
+CONFIRM_TEMPLATE = (
+    "✅ *ПРОВЕРЬТЕ ДАННЫЕ ЗАПИСИ:*\n\n"
+    + BOOKING_CARD +
+    "📞 *Контакты:* {contacts}\n\n"
+    "Всё верно? Подтверждаете запись?"
+)
+
+CREATED_TEMPLATE = (
+    "🎉 *ПРЕДВАРИТЕЛЬНАЯ ЗАПИСЬ #{id} СОЗДАНА!*\n\n"
+    + BOOKING_CARD +
+    "📞 *Контакты:* {contacts}\n\n"
+    "⚠️ *Это предварительная запись!*\n"
+    "Администратор свяжется с вами в ближайшее время для подтверждения.\n\n"
+    "Спасибо за доверие! 💖"
+)
+
+ADMIN_NOTIFICATION_TEMPLATE = (
+    "🎉 *НОВАЯ ПРЕДВАРИТЕЛЬНАЯ ЗАПИСЬ*\n\n"
+    "👤 *Клиент:* {client}\n"
+    "📞 *Контакты:* {contacts}\n"
+    + BOOKING_CARD +
+    "🔢 *Номер записи:* #{id}\n\n"
+    "🔗 *Telegram:* {telegram}\n"
+    "🆔 *User ID:* `{user_id}`\n"
+    "💬 *Чат ID:* `{chat_id}`\n\n"
+    "⚠️ *Необходимо связаться с клиентом для подтверждения!*"
+)
+
+# Сводка новых записей для администраторов в режиме сводок
+ADMIN_DIGEST_HEADER = "🗂 *СВОДКА НОВЫХ ЗАПИСЕЙ ({count})*\n\n"
+ADMIN_DIGEST_ITEM = (
+    "⏳ *{service}* - {date}\n"
+    "   👤 {client}, 📞 {contacts}\n"
+    "   🔢 №{id}, 💬 Чат ID: `{chat_id}`\n"
+)
+
+REMINDER_HEADERS = {
+    'day': "⏰ *НАПОМИНАНИЕ О ЗАПИСИ*\n\nЗавтра в {time} у вас запись:\n",
+    'hour': "⏰ *СКОРО НАЧНЕТСЯ ПРОЦЕДУРА!*\n\nЧерез 1 час у вас запись:\n",
+}
+REMINDER_FOOTERS = {
+    'day': "⚠️ Пожалуйста, не опаздывайте!",
+    'hour': "🚗 Успейте вовремя!",
+}
+REMINDER_TEMPLATE = (
+    "{header}"
+    + BOOKING_CARD +
+    "\n📞 *Контакты студии:* {studio_phone}\n"
+    "🏠 *Адрес:* {studio_address}\n\n"
+    "{footer}"
+)
+
+# Строки списков записей: администратору (все записи и записи на день) и клиенту
+ADMIN_LIST_ITEM = (
+    "{status_emoji} *{service}*\n"
+    "   📅 {date}\n"
+    "   👤 {client}\n"
+    "   📞 {contacts}\n"
+    "   🔢 №{id}\n"
+    "   🏷️ Статус: {status}\n"
+    "   👤 User ID: `{user_id}`\n\n"
+)
+DAY_LIST_ITEM = (
+    "{number}. {status_emoji} *{service}*\n"
+    "   🕐 {time}\n"
+    "   👤 {client}\n"
+    "   📞 {contacts}\n"
+    "   🔢 №{id}\n"
+    "   🏷️ Статус: {status}\n\n"
+)
+CLIENT_LIST_ITEM = (
+    "{number}. {status_emoji} *{service}*\n"
+    "   📅 {date}\n"
+    "   🔢 №{id}\n"
+    "   📞 {contacts}\n"
+    "   🏷️ Статус: {status}\n\n"
+)
+
+CONTACTS_TEMPLATE = (
+    "📞 *КОНТАКТЫ СТУДИИ КРАСОТЫ*\n\n"
+    "📱 *Телефон:* {phone}\n"
+    "📸 *Instagram:* {instagram}\n"
+    "🏠 *Адрес:* {address}\n"
+    "🕐 *Часы работы:* {hours}\n\n"
+    "📍 *Мы ждем вас в гости!*"
+)
+
+
+def md(value, default=''):
+    """Экранирует значение для parse_mode='Markdown'"""
+    if value is None or value == '':
+        return default
+    return escape_markdown(str(value), version=1)
+
+
+def client_name(booking, default='Не указано'):
+    """Имя клиента из записи без пустых частей и "None\""""
+    name = f"{booking.get('first_name') or ''} {booking.get('last_name') or ''}".strip()
+    return name or booking.get('username') or default
+
+
+class MessageRenderer:
+    """Тексты и клавиатуры бота.
+
+    Контакты студии экранируются один раз при создании, клавиатура выбора
+    даты перестраивается только при смене дня. Карточки записи для
+    клиента, администраторов и напоминаний собираются из общих шаблонов,
+    а все пользовательские значения проходят через md().
+    """
+
+    def __init__(self, studio_contacts):
+        self.studio = {key: md(value) for key, value in studio_contacts.items()}
+        self.contacts_text = CONTACTS_TEMPLATE.format_map(self.studio)
+        self._date_keyboard = None
+        self._date_keyboard_day = None
+
+    def date_keyboard(self, now=None):
+        """Клавиатура выбора даты: сегодня, завтра, послезавтра"""
+        today = (now or datetime.now()).date()
+        if today != self._date_keyboard_day:
+            tomorrow = today + timedelta(days=1)
+            after_tomorrow = today + timedelta(days=2)
+            self._date_keyboard = ReplyKeyboardMarkup([
+                [f"📅 Сегодня ({today.strftime('%d.%m')})", f"📅 Завтра ({tomorrow.strftime('%d.%m')})"],
+                [f"📅 Послезавтра ({after_tomorrow.strftime('%d.%m')})", "📅 Другая дата"],
+                ["🔙 Назад к услугам"]
+            ], resize_keyboard=True)
+            self._date_keyboard_day = today
+        return self._date_keyboard
+
+    @staticmethod
+    def _fields(booking):
+        status_emoji, status_text = STATUS_LABELS.get(booking.get('status'), STATUS_LABELS['pending'])
+        date = booking.get('date') or ''
+        return {
+            'id': booking.get('id'),
+            'service': md(booking.get('service')),
+            'date': md(date),
+            'time': md(date.split()[-1] if date else ''),
+            'duration': booking.get('duration'),
+            'contacts': md(booking.get('contacts'), 'Не указаны'),
+            'client': md(client_name(booking)),
+            'user_id': booking.get('user_id', ''),
+            'chat_id': booking.get('chat_id', ''),
+            'status_emoji': status_emoji,
+            'status': status_text,
+        }
+
+    def confirm_text(self, booking):
+        """Проверка данных перед подтверждением записи клиентом"""
+        return CONFIRM_TEMPLATE.format_map(self._fields(booking))
+
+    def created_text(self, booking):
+        """Ответ клиенту о созданной записи"""
+        return CREATED_TEMPLATE.format_map(self._fields(booking))
+
+    def admin_notification(self, booking):
+        """Уведомление администраторов о новой записи"""
+        fields = self._fields(booking)
+        username = booking.get('username')
+        fields['telegram'] = f"[@{md(username)}](https://t.me/{username})" if username else "Не указан"
+        return ADMIN_NOTIFICATION_TEMPLATE.format_map(fields)
+
+    def admin_digest_item(self, booking):
+        """Строка сводки новых записей"""
+        return ADMIN_DIGEST_ITEM.format_map(self._fields(booking))
+
+    @staticmethod
+    def admin_digest(lines):
+        """Сводка из строк admin_digest_item"""
+        return ADMIN_DIGEST_HEADER.format(count=len(lines)) + "\n".join(lines)
+
+    def reminder(self, booking, kind):
+        """Напоминание о записи ('day' - за день, 'hour' - за час)"""
+        fields = self._fields(booking)
+        fields['header'] = REMINDER_HEADERS[kind].format(time=fields['time'])
+        fields['footer'] = REMINDER_FOOTERS[kind]
+        fields['studio_phone'] = self.studio['phone']
+        fields['studio_address'] = self.studio['address']
+        return REMINDER_TEMPLATE.format_map(fields)
+
+    def admin_list_item(self, booking):
+        return ADMIN_LIST_ITEM.format_map(self._fields(booking))
+
+    def day_list_item(self, number, booking):
+        return DAY_LIST_ITEM.format_map(dict(self._fields(booking), number=number))
+
+    def client_list_item(self, number, booking):
+        return CLIENT_LIST_ITEM.format_map(dict(self._fields(booking), number=number))
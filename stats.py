@@ -0,0 +1,40 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCache:
+    """Кэш сводной статистики для /admin и /status.
+
+    Сводка пересчитывается не чаще раза в ttl_seconds. Одновременные
+    запросы во время пересчета ждут один общий запрос к базе, поэтому
+    серия вызовов /status нагружает базу не больше одного раза за TTL.
+    После изменения записей кэш сбрасывается через invalidate().
+    """
+
+    def __init__(self, db, ttl_seconds=30):
+        # Асинхронное хранилище записей (BookingRepository через db.AsyncExecutorProxy)
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self._summary = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Сбрасывает кэш, следующий запрос перечитает статистику"""
+        self._expires_at = 0.0
+
+    async def get(self):
+        """Возвращает сводку (см. BookingRepository.stats_summary)"""
+        if self._summary is not None and time.monotonic() < self._expires_at:
+            return self._summary
+        async with self._lock:
+            # Пока ждали блокировку, сводку мог обновить другой запрос
+            if self._summary is not None and time.monotonic() < self._expires_at:
+                return self._summary
+            self._summary = await self.db.stats_summary()
+            self._expires_at = time.monotonic() + self.ttl_seconds
+            logger.debug("Статистика записей пересчитана")
+            return self._summary
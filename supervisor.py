@@ -0,0 +1,181 @@
+import os
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class BotSupervisor:
+    """Запускает процесс бота и следит за ним.
+
+    Вывод процесса (stdout и stderr вместе) читает отдельный поток, поэтому
+    буфер канала не переполняется и бот не блокируется на записи в лог;
+    последние строки хранятся для /status. Упавший процесс перезапускается
+    с экспоненциальной задержкой от min_backoff до max_backoff секунд;
+    если процесс проработал stable_seconds, задержка сбрасывается.
+    Остановка и перезапуск посылают SIGTERM и ждут stop_timeout секунд,
+    прежде чем убить процесс.
+    """
+
+    def __init__(self, command, cwd=None, min_backoff=1, max_backoff=300, stable_seconds=60,
+                 stop_timeout=15, output_lines=200):
+        self.command = command
+        self.cwd = cwd
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_seconds = stable_seconds
+        self.stop_timeout = stop_timeout
+        self.output = deque(maxlen=output_lines)
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.crashes = 0
+        self.last_exit_code = None
+        self.backoff = min_backoff
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._restart_requested = False
+        self._monitor = None
+
+    @property
+    def running(self):
+        """Наблюдение запущено (сам процесс может ждать перезапуска)"""
+        return self._monitor is not None and self._monitor.is_alive()
+
+    def start(self):
+        """Запускает бота. Возвращает False, если он уже запущен"""
+        with self._lock:
+            if self.running:
+                return False
+            self._stopping = False
+            self._monitor = threading.Thread(target=self._run, name='bot-supervisor', daemon=True)
+            self._monitor.start()
+            return True
+
+    def restart(self):
+        """Перезапускает процесс бота без задержки (или запускает наблюдение)"""
+        if not self.running:
+            return self.start()
+        with self._lock:
+            process = self.process
+            alive = process is not None and process.poll() is None
+            # Процесс жив - останавливаем его, иначе просто прерываем ожидание перезапуска
+            self._restart_requested = alive
+            if alive:
+                self.restarts += 1
+            else:
+                self.backoff = self.min_backoff
+        self._wakeup.set()
+        if alive:
+            self._terminate(process)
+        return True
+
+    def stop(self):
+        """Останавливает бота и наблюдение за ним"""
+        with self._lock:
+            self._stopping = True
+            process = self.process
+            monitor = self._monitor
+        self._wakeup.set()
+        if process is not None:
+            self._terminate(process)
+        if monitor is not None and monitor is not threading.current_thread():
+            monitor.join(self.stop_timeout)
+
+    def status(self):
+        """Состояние для /status и /restart"""
+        with self._lock:
+            process = self.process
+            alive = process is not None and process.poll() is None
+            return {
+                'running': alive,
+                'pid': process.pid if alive else None,
+                'uptime_seconds': round(time.time() - self.started_at) if alive and self.started_at else 0,
+                'restarts': self.restarts,
+                'crashes': self.crashes,
+                'last_exit_code': self.last_exit_code,
+                'next_backoff_seconds': self.backoff,
+                'recent_output': list(self.output)[-20:],
+            }
+
+    def _terminate(self, process):
+        if process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(self.stop_timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Бот (pid {process.pid}) не завершился за {self.stop_timeout} с, останавливаем принудительно")
+            process.kill()
+            process.wait()
+
+    def _drain(self, process):
+        """Читает вывод процесса построчно, пока тот не закроет канал.
+
+        Бот сам пишет лог в bot.log с ротацией, поэтому здесь строки только
+        попадают в буфер для /status и в лог app.py на уровне DEBUG.
+        """
+        for line in process.stdout:
+            line = line.rstrip()
+            self.output.append(line)
+            logger.debug(f"[bot] {line}")
+        process.stdout.close()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopping:
+                    break
+                try:
+                    process = subprocess.Popen(
+                        self.command, cwd=self.cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                        text=True, encoding='utf-8', errors='replace', bufsize=1,
+                        env=dict(os.environ, PYTHONUNBUFFERED='1')
+                    )
+                except OSError as e:
+                    logger.error(f"Ошибка запуска бота: {e}")
+                    process = None
+                else:
+                    self.process = process
+                    self.started_at = time.time()
+                    logger.info(f"Бот запущен, pid {process.pid}")
+
+            if process is not None:
+                drain = threading.Thread(target=self._drain, args=(process,), name='bot-output', daemon=True)
+                drain.start()
+                exit_code = process.wait()
+                # Вывод дочитывается после выхода процесса
+                drain.join(5)
+                runtime = time.time() - self.started_at
+            else:
+                exit_code, runtime = None, 0
+
+            with self._lock:
+                self.last_exit_code = exit_code
+                if self._stopping:
+                    logger.info(f"Бот остановлен, код выхода {exit_code}")
+                    break
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self.backoff = self.min_backoff
+                    delay = 0
+                    logger.info(f"Бот перезапускается по запросу, код выхода {exit_code}")
+                else:
+                    self.restarts += 1
+                    self.crashes += 1
+                    if runtime >= self.stable_seconds:
+                        self.backoff = self.min_backoff
+                    delay = self.backoff
+                    self.backoff = min(self.backoff * 2, self.max_backoff)
+                    logger.error(f"Бот завершился с кодом {exit_code} через {runtime:.0f} с, перезапуск через {delay} с")
+                    # Построчный вывод идет в DEBUG, поэтому хвост с причиной падения показываем здесь
+                    for line in list(self.output)[-10:]:
+                        logger.error(f"[bot] {line}")
+                self._wakeup.clear()
+
+            if delay:
+                self._wakeup.wait(delay)
@@ -0,0 +1,151 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import availability
+from availability import AvailabilityIndex, _DaySchedule
+from booking_repository import to_epoch
+
+DAY = date(2030, 5, 20)
+
+
+def at(hour, minute=0):
+    return datetime.combine(DAY, time(hour, minute))
+
+
+def booking(booking_id, start, minutes, status='confirmed'):
+    return {
+        'id': booking_id, 'status': status,
+        'start_ts': to_epoch(start), 'end_ts': to_epoch(start + timedelta(minutes=minutes)),
+    }
+
+
+@pytest.fixture
+def index():
+    return AvailabilityIndex(opening_hour=9, closing_hour=19, slot_step_minutes=60, hold_ttl_minutes=10)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(availability.monotonic_time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_touching_intervals_are_free(index):
+    index.add(booking(1, at(10), 60))
+    assert index.is_free(at(9), 60)
+    assert index.is_free(at(11), 60)
+    assert not index.is_free(at(10, 30), 60)
+    assert not index.is_free(at(9, 30), 60)
+    # Запрошенный интервал целиком накрывает запись
+    assert not index.is_free(at(9), 180)
+
+
+def test_cancelled_and_undated_bookings_are_not_indexed(index):
+    index.add(booking(1, at(10), 60, status='cancelled'))
+    index.add({'id': 2, 'status': 'pending', 'start_ts': None, 'end_ts': None})
+    assert index.is_free(at(10), 60)
+
+
+def test_remove_frees_interval(index):
+    index.add(booking(1, at(10), 60))
+    assert index.remove(1)
+    assert index.is_free(at(10), 60)
+    assert not index.remove(1)
+
+
+def test_long_booking_covers_later_starts(index):
+    """Длинная запись пересекается с интервалом, начавшимся после коротких записей"""
+    index.add(booking(1, at(9), 240))
+    index.add(booking(2, at(10), 30))
+    index.add(booking(3, at(11), 30))
+    assert not index.is_free(at(12), 30)
+
+    # После удаления длинной записи max_ends пересчитывается
+    index.remove(1)
+    assert index.is_free(at(12), 30)
+    assert index.is_free(at(10, 30), 30)
+    assert not index.is_free(at(11, 15), 30)
+
+
+def test_day_schedule_matches_brute_force():
+    rng = random.Random(7)
+    schedule = _DaySchedule()
+    intervals = {}
+    for step in range(400):
+        if intervals and rng.random() < 0.3:
+            booking_id = rng.choice(list(intervals))
+            schedule.remove(booking_id)
+            del intervals[booking_id]
+        else:
+            start = rng.randrange(0, 600)
+            intervals[step] = (start, start + rng.randrange(1, 120))
+            schedule.add(*intervals[step], step)
+
+        query_start = rng.randrange(0, 700)
+        query_end = query_start + rng.randrange(1, 120)
+        expected = any(start < query_end and end > query_start for start, end in intervals.values())
+        assert schedule.overlaps(query_start, query_end) == expected
+        assert len(schedule) == len(intervals)
+
+
+def test_free_slots_follow_changes(index):
+    now = datetime.combine(DAY - timedelta(days=1), time(12))
+    assert len(index.free_slots(DAY, 60, now=now)) == 10
+    index.add(booking(1, at(10), 90))
+    assert time(10) not in index.free_slots(DAY, 60, now=now)
+    assert time(11) not in index.free_slots(DAY, 60, now=now)
+    index.remove(1)
+    assert len(index.free_slots(DAY, 60, now=now)) == 10
+
+
+def test_hold_blocks_others_but_not_owner(index, clock):
+    index.hold(1, at(10), 60)
+    assert not index.is_free(at(10), 60, owner=2)
+    assert index.is_free(at(10), 60, owner=1)
+    now = datetime.combine(DAY - timedelta(days=1), time(12))
+    assert time(10) not in index.free_slots(DAY, 60, now=now, owner=2)
+    assert time(10) in index.free_slots(DAY, 60, now=now, owner=1)
+
+
+def test_new_hold_replaces_previous(index, clock):
+    index.hold(1, at(10), 60)
+    index.hold(1, at(14), 60)
+    assert index.is_free(at(10), 60, owner=2)
+    assert not index.is_free(at(14), 60, owner=2)
+
+
+def test_hold_expires(index, clock):
+    index.hold(1, at(10), 60)
+    clock[0] += 10 * 60 - 1
+    assert not index.is_free(at(10), 60, owner=2)
+    clock[0] += 1
+    assert index.is_free(at(10), 60, owner=2)
+    # Истекшая бронь снята и не продлевается
+    assert not index.refresh(1)
+
+
+def test_refresh_extends_hold(index, clock):
+    index.hold(1, at(10), 60)
+    clock[0] += 9 * 60
+    assert index.refresh(1)
+    clock[0] += 9 * 60
+    assert not index.is_free(at(10), 60, owner=2)
+
+
+def test_release(index, clock):
+    index.hold(1, at(10), 60)
+    assert index.release(1)
+    assert index.is_free(at(10), 60, owner=2)
+    assert not index.release(1)
+
+
+def test_prune_drops_past_days(index, clock):
+    index.add(booking(1, at(10), 60))
+    index.hold(2, at(12), 60)
+    index.prune(DAY + timedelta(days=1))
+    assert index.is_free(at(10), 60, owner=3)
+    assert index.is_free(at(12), 60, owner=3)
+    assert not index.remove(1)
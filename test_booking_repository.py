@@ -0,0 +1,149 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import ConnectionManager
+from booking_repository import BookingRepository, SlotTakenError, DATE_FORMAT
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'bookings.db')
+    connections = ConnectionManager(path)
+    BookingRepository(connections).init_schema()
+    connections.close_all()
+    return path
+
+
+@pytest.fixture
+def repository(db_path):
+    connections = ConnectionManager(db_path)
+    yield BookingRepository(connections)
+    connections.close_all()
+
+
+def booking_data(start, duration=60, user_id=1, service='💅 Маникюр'):
+    return {
+        'service': service,
+        'date': start.strftime(DATE_FORMAT),
+        'duration': duration,
+        'contacts': '+7 900 000-00-00',
+        'timestamp': datetime.now().isoformat(),
+        'chat_id': user_id,
+        'user_id': user_id,
+        'username': f'user{user_id}',
+        'first_name': 'Тест',
+        'last_name': '',
+    }
+
+
+def test_concurrent_create_same_slot(db_path):
+    """Из двух одновременных записей на одно время проходит ровно одна"""
+    start = datetime(2030, 5, 20, 10, 0)
+    attempts = 20
+    barrier = threading.Barrier(2, timeout=10)
+    results = [[] for _ in range(attempts)]
+
+    def client(user_id):
+        # Свое хранилище и соединение на каждого клиента, как у двух процессов бота
+        connections = ConnectionManager(db_path)
+        repository = BookingRepository(connections)
+        try:
+            for attempt in range(attempts):
+                data = booking_data(start + timedelta(days=attempt), user_id=user_id)
+                barrier.wait()
+                try:
+                    results[attempt].append(repository.create(data))
+                except Exception as e:
+                    results[attempt].append(e)
+        except threading.BrokenBarrierError:
+            # Второй клиент не дошел до барьера за timeout - недостающие результаты провалят проверку
+            pass
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=client, args=(user_id,)) for user_id in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    ids = []
+    for outcome in results:
+        created = [value for value in outcome if isinstance(value, int)]
+        rejected = [value for value in outcome if isinstance(value, SlotTakenError)]
+        assert len(created) == 1 and len(rejected) == 1
+        ids.extend(created)
+    assert len(set(ids)) == attempts
+
+
+def test_create_rejects_overlap(repository):
+    start = datetime(2030, 5, 20, 10, 0)
+    repository.create(booking_data(start, duration=90))
+    with pytest.raises(SlotTakenError):
+        repository.create(booking_data(start + timedelta(minutes=60), user_id=2))
+    # Встык к концу записи - можно
+    assert repository.create(booking_data(start + timedelta(minutes=90), user_id=2))
+
+
+def test_cancelled_booking_is_not_confirmed(repository):
+    """Подтверждение админа не возвращает запись, которую клиент уже отменил"""
+    booking_id = repository.create(booking_data(datetime(2030, 5, 20, 10, 0)))
+    assert repository.set_status(booking_id, 'cancelled')
+    assert not repository.set_status(booking_id, 'confirmed', unless='cancelled')
+    assert repository.get(booking_id)['status'] == 'cancelled'
+
+    other_id = repository.create(booking_data(datetime(2030, 5, 20, 12, 0)))
+    assert repository.set_status(other_id, 'confirmed', unless='cancelled')
+    assert repository.get(other_id)['status'] == 'confirmed'
+
+
+def test_list_page_round_trip(repository):
+    """Листание вперед и назад по курсору проходит все записи без пропусков и повторов"""
+    start = datetime(2030, 5, 20, 9, 0)
+    for day in range(4):
+        for hour in range(5):
+            repository.create(booking_data(start + timedelta(days=day, hours=hour), user_id=hour))
+    # Отмененная запись и новая на то же время: одинаковый start_ts, порядок решает id
+    cancelled_id = repository.create(booking_data(start + timedelta(days=5)))
+    repository.set_status(cancelled_id, 'cancelled')
+    repository.create(booking_data(start + timedelta(days=5), user_id=2))
+
+    expected = [(booking['start_ts'], booking['id']) for booking in repository.list_all()]
+    expected.sort()
+    assert len(expected) == 22
+
+    pages = []
+    page, has_more = repository.list_page(limit=6)
+    pages.append(page)
+    while has_more:
+        last = page[-1]
+        page, has_more = repository.list_page(after=(last['start_ts'], last['id']), limit=6)
+        pages.append(page)
+    forward = [(booking['start_ts'], booking['id']) for page in pages for booking in page]
+    assert forward == expected
+    assert [len(page) for page in pages] == [6, 6, 6, 4]
+
+    # Назад от последней страницы возвращаются те же страницы
+    for previous, current in zip(reversed(pages[:-1]), reversed(pages[1:])):
+        first = current[0]
+        page, has_more = repository.list_page(before=(first['start_ts'], first['id']), limit=6)
+        assert [booking['id'] for booking in page] == [booking['id'] for booking in previous]
+        assert has_more == (previous is not pages[0])
+
+
+def test_list_page_filters(repository):
+    start = datetime(2030, 5, 20, 9, 0)
+    for hour in range(4):
+        service = '💅 Маникюр' if hour % 2 else '👣 Педикюр'
+        repository.create(booking_data(start + timedelta(hours=hour), service=service))
+    first_id = repository.list_page(limit=1)[0][0]['id']
+    repository.set_status(first_id, 'confirmed')
+
+    page, has_more = repository.list_page(services=['💅 Маникюр'])
+    assert [booking['service'] for booking in page] == ['💅 Маникюр'] * 2 and not has_more
+    page, _ = repository.list_page(status='confirmed')
+    assert [booking['id'] for booking in page] == [first_id]
+    page, _ = repository.list_page(date_from=(start + timedelta(days=1)).date())
+    assert page == []
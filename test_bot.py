@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+from datetime import datetime
+
+import pytest
+from telegram import Update
+
+import bot
+import availability
+
+
+@pytest.fixture
+def salon_bot(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, 'DATABASE', str(tmp_path / 'bookings.db'))
+    monkeypatch.setattr(bot, 'BOOKINGS_JSON', str(tmp_path / 'bookings.json'))
+    monkeypatch.setattr(bot, 'HEARTBEAT_FILE', str(tmp_path / 'heartbeat.json'))
+    salon_bot = bot.BeautySalonBot('123:TEST')
+    yield salon_bot
+    salon_bot.db_executor.shutdown(wait=True)
+    salon_bot.connections.close_all()
+
+
+def text_update(salon_bot, text, edited=False):
+    message = {
+        'message_id': 1, 'date': 1760000000, 'text': text,
+        'chat': {'id': 42, 'type': 'private'},
+        'from': {'id': 42, 'is_bot': False, 'first_name': 'Тест'},
+    }
+    if edited:
+        message['edit_date'] = 1760000060
+    key = 'edited_message' if edited else 'message'
+    return Update.de_json({'update_id': 1, key: message}, salon_bot.application.bot)
+
+
+def first_handler(salon_bot, update):
+    """Обработчик основной группы, который получит обновление, или None"""
+    for handler in salon_bot.application.handlers[0]:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return getattr(getattr(handler, 'callback', None), '__name__', type(handler).__name__)
+    return None
+
+
+@pytest.mark.parametrize('text', ['📞 Контакты', 'привет', '💅 Записаться на процедуру'])
+def test_edited_text_is_ignored(salon_bot, text):
+    """Исправленное сообщение не доходит до обработчиков: в нем update.message равен None"""
+    assert first_handler(salon_bot, text_update(salon_bot, text, edited=True)) is None
+
+
+def test_new_text_is_handled(salon_bot):
+    assert first_handler(salon_bot, text_update(salon_bot, '📞 Контакты')) == 'route_message'
+    assert first_handler(salon_bot, text_update(salon_bot, 'привет')) == 'route_message'
+    assert first_handler(salon_bot, text_update(salon_bot, '💅 Записаться на процедуру')) == 'ConversationHandler'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Управляемые часы для сроков броней"""
+    now = [1000.0]
+    monkeypatch.setattr(availability.monotonic_time, 'monotonic', lambda: now[0])
+    return now
+
+
+def booking_context(start, duration=60):
+    return SimpleNamespace(user_data={
+        'date': start.strftime('%d.%m.%Y %H:%M'), 'duration': duration,
+        'selected_date': start.date().isoformat(),
+    })
+
+
+def test_keep_hold_extends_hold_on_each_step(salon_bot, clock):
+    start = datetime(2030, 5, 20, 10, 0)
+    hold_seconds = bot.SLOT_HOLD_MINUTES * 60
+    salon_bot.availability.hold(1, start, 60)
+
+    # Контакты введены незадолго до истечения брони - отсчет начинается заново
+    clock[0] += hold_seconds - 60
+    assert salon_bot.keep_hold(1, booking_context(start))
+    clock[0] += hold_seconds - 60
+    assert not salon_bot.availability.is_free(start, 60, owner=2)
+
+
+def test_keep_hold_reclaims_expired_free_slot(salon_bot, clock):
+    start = datetime(2030, 5, 20, 10, 0)
+    salon_bot.availability.hold(1, start, 60)
+    clock[0] += bot.SLOT_HOLD_MINUTES * 60 + 1
+    assert salon_bot.keep_hold(1, booking_context(start))
+    assert not salon_bot.availability.is_free(start, 60, owner=2)
+
+
+def test_keep_hold_fails_when_slot_was_taken(salon_bot, clock):
+    start = datetime(2030, 5, 20, 10, 0)
+    salon_bot.availability.hold(1, start, 60)
+    clock[0] += bot.SLOT_HOLD_MINUTES * 60 + 1
+    # Пока бронь первого клиента была истекшей, время выбрал другой
+    salon_bot.availability.hold(2, start, 60)
+    assert not salon_bot.keep_hold(1, booking_context(start))
+
+
+def test_conversation_timeout_is_independent_of_hold(salon_bot):
+    conversation = next(
+        handler for handler in salon_bot.application.handlers[0]
+        if type(handler).__name__ == 'ConversationHandler'
+    )
+    assert conversation.conversation_timeout == bot.CONVERSATION_TIMEOUT_MINUTES * 60
@@ -0,0 +1,76 @@
+from datetime import date, time
+
+import pytest
+
+from input_parser import parse_date, parse_time
+
+# Воскресенье
+TODAY = date(2026, 10, 18)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('сегодня', date(2026, 10, 18)),
+    ('Завтра', date(2026, 10, 19)),
+    ('послезавтра', date(2026, 10, 20)),
+    ('25.12', date(2026, 12, 25)),
+    ('25/12/2027', date(2027, 12, 25)),
+    ('5-1-27', date(2027, 1, 5)),
+    # Прошедшая в этом году дата без года - следующий год
+    ('01.03', date(2027, 3, 1)),
+    ('2026-11-05', date(2026, 11, 5)),
+    ('25 декабря', date(2026, 12, 25)),
+    ('5 мая 2027', date(2027, 5, 5)),
+    ('1 ноября', date(2026, 11, 1)),
+])
+def test_parse_date_formats(text, expected):
+    assert parse_date(text, TODAY) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('в понедельник', date(2026, 10, 19)),
+    ('во вторник', date(2026, 10, 20)),
+    ('в среду', date(2026, 10, 21)),
+    ('чт', date(2026, 10, 22)),
+    ('пятницу', date(2026, 10, 23)),
+    ('Суббота', date(2026, 10, 24)),
+    # Сегодняшний день недели - сегодня
+    ('воскресенье', date(2026, 10, 18)),
+])
+def test_parse_date_weekdays(text, expected):
+    assert parse_date(text, TODAY) == expected
+
+
+@pytest.mark.parametrize('text', ['понял', 'второе', 'восьмое число', 'пятое ноября', 'средний', 'вставить'])
+def test_words_starting_like_weekdays_are_not_weekdays(text):
+    """Раньше первые три буквы любого слова сверялись с днями недели"""
+    with pytest.raises(ValueError):
+        parse_date(text, TODAY)
+
+
+def test_parse_date_dateutil_fallback():
+    assert parse_date('Dec 25 2027', TODAY) == date(2027, 12, 25)
+    assert parse_date('25 December 2027', TODAY) == date(2027, 12, 25)
+
+
+@pytest.mark.parametrize('text', ['', 'когда-нибудь', '32.01', '10.13.2027', '31 февраля'])
+def test_parse_date_invalid(text):
+    with pytest.raises(ValueError):
+        parse_date(text, TODAY)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('15:30', time(15, 30)),
+    ('9.05', time(9, 5)),
+    ('🕘 09:00', time(9, 0)),
+    ('15', time(15, 0)),
+    ('в 11', time(11, 0)),
+    ('14 часов', time(14, 0)),
+])
+def test_parse_time(text, expected):
+    assert parse_time(text) == expected
+
+
+@pytest.mark.parametrize('text', ['', 'утром', '25:00', '12:75', 'в 99'])
+def test_parse_time_invalid(text):
+    with pytest.raises(ValueError):
+        parse_time(text)
@@ -0,0 +1,38 @@
+import asyncio
+from datetime import datetime
+
+from telegram.ext import ApplicationBuilder
+
+from reminders import ReminderScheduler
+
+
+def test_due_batch_survives_slow_start():
+    """Пачка, поставленная до запуска job_queue, не теряется, если старт занял больше секунды"""
+    async def scenario():
+        application = ApplicationBuilder().token('1:TEST').build()
+        job_queue = application.job_queue
+        scheduler = ReminderScheduler(job_queue, None, None, None)
+        fired = []
+
+        async def record(context):
+            fired.append(context.job.data)
+
+        scheduler._run = record
+        now = datetime.now()
+        scheduler._add_to_batch(now, (1, 'hour'), now)
+
+        # Загрузка записей и прочий старт бота
+        await asyncio.sleep(1.5)
+        job_queue.set_application(application)
+        await job_queue.start()
+        try:
+            for _ in range(50):
+                if fired:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await job_queue.stop(wait=False)
+        return fired, list(scheduler._batches)
+
+    fired, keys = asyncio.run(scenario())
+    assert fired == keys
@@ -0,0 +1,149 @@
+import os
+import time
+import asyncio
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с настраиваемым keep-alive и счетчиками пула соединений.
+
+    Перед запросом занимается место в пуле; время ожидания места и число
+    запросов в работе копятся в счетчиках. Если место не освободилось за
+    pool_timeout, бросается TimedOut, как и при исчерпании пула httpx.
+    Если передан registry (metrics.MetricsRegistry), в него пишутся время
+    и код ответа каждого метода Telegram API.
+    """
+
+    def __init__(self, name, connection_pool_size=1, keepalive_connections=None,
+                 keepalive_seconds=5.0, registry=None, **kwargs):
+        # Лимиты нужны уже в _build_client, который вызывает конструктор HTTPXRequest
+        self._limits = httpx.Limits(
+            max_connections=connection_pool_size,
+            max_keepalive_connections=keepalive_connections or connection_pool_size,
+            keepalive_expiry=keepalive_seconds,
+        )
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+        self.name = name
+        self.registry = registry
+        self.pool_size = connection_pool_size
+        self._slots = asyncio.Semaphore(connection_pool_size)
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.pool_wait_total = 0.0
+        self.pool_wait_max = 0.0
+        self.pool_timeouts = 0
+
+    def _build_client(self):
+        # HTTPXRequest не принимает настройки keep-alive: подменяем только лимиты.
+        # Клиент строится здесь же и при повторном initialize() после shutdown()
+        return httpx.AsyncClient(**{**self._client_kwargs, 'limits': self._limits})
+
+    async def do_request(
+        self,
+        url,
+        method,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ):
+        if pool_timeout is BaseRequest.DEFAULT_NONE:
+            wait_limit = self._client.timeout.pool
+        else:
+            wait_limit = pool_timeout
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), wait_limit)
+        except asyncio.TimeoutError as exc:
+            self.pool_timeouts += 1
+            raise TimedOut(
+                f"Pool timeout: все {self.pool_size} соединений пула {self.name} заняты"
+            ) from exc
+        waited = time.monotonic() - started
+        self.pool_wait_total += waited
+        self.pool_wait_max = max(self.pool_wait_max, waited)
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        api_method = url.rsplit('/', 1)[-1]
+        code = 'error'
+        request_started = time.perf_counter()
+        try:
+            result = await super().do_request(
+                url, method, request_data, read_timeout, write_timeout, connect_timeout, pool_timeout
+            )
+            code = str(result[0])
+            return result
+        except Exception as exc:
+            code = type(exc).__name__
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            if self.registry is not None:
+                labels = (('method', api_method),)
+                self.registry.observe('telegram_api_request_duration_seconds', labels, time.perf_counter() - request_started)
+                self.registry.inc('telegram_api_requests_total', labels + (('code', code),))
+
+    def gauges(self):
+        """Счетчики пула для MetricsRegistry.add_collector"""
+        labels = (('pool', self.name),)
+        return [
+            ('telegram_pool_size', labels, self.pool_size),
+            ('telegram_pool_in_flight', labels, self.in_flight),
+            ('telegram_pool_wait_seconds_total', labels, round(self.pool_wait_total, 6)),
+            ('telegram_pool_timeouts_total', labels, self.pool_timeouts),
+        ]
+
+    def metrics(self):
+        """Счетчики пула: запросов, в работе, ожидание места в пуле"""
+        return {
+            'name': self.name,
+            'pool_size': self.pool_size,
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'pool_wait_avg': self.pool_wait_total / self.requests if self.requests else 0.0,
+            'pool_wait_max': self.pool_wait_max,
+            'pool_timeouts': self.pool_timeouts,
+        }
+
+
+def _optional_float(value):
+    """'' или 'none' - без ограничения (None), иначе число секунд"""
+    if value is None or value.strip().lower() in ('', 'none'):
+        return None
+    return float(value)
+
+
+def build_request(name, prefix, pool_size=1, read_timeout=5.0, keepalive_seconds=30.0, registry=None):
+    """Создает InstrumentedRequest с настройками из переменных окружения.
+
+    Переменные с префиксом prefix: _POOL_SIZE, _POOL_TIMEOUT,
+    _CONNECT_TIMEOUT, _READ_TIMEOUT, _WRITE_TIMEOUT, _KEEPALIVE_CONNECTIONS,
+    _KEEPALIVE_SECONDS и _HTTP_VERSION (1.1 или 2; для HTTP/2 нужен
+    python-telegram-bot[http2]). Остальные аргументы - значения по умолчанию;
+    registry передается в InstrumentedRequest.
+    """
+    def setting(key, default):
+        return os.getenv(f'{prefix}_{key}', default)
+
+    keepalive_connections = setting('KEEPALIVE_CONNECTIONS', '')
+    return InstrumentedRequest(
+        name,
+        connection_pool_size=int(setting('POOL_SIZE', pool_size)),
+        keepalive_connections=int(keepalive_connections) if keepalive_connections else None,
+        keepalive_seconds=_optional_float(setting('KEEPALIVE_SECONDS', str(keepalive_seconds))),
+        pool_timeout=_optional_float(setting('POOL_TIMEOUT', '1.0')),
+        connect_timeout=_optional_float(setting('CONNECT_TIMEOUT', '5.0')),
+        read_timeout=_optional_float(setting('READ_TIMEOUT', str(read_timeout))),
+        write_timeout=_optional_float(setting('WRITE_TIMEOUT', '5.0')),
+        http_version=setting('HTTP_VERSION', '1.1'),
+        registry=registry,
+    )
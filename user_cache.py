@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from booking_repository import to_epoch
+
+
+class UserBookingsCache:
+    """LRU-кэш актуальных записей пользователей для "📊 Мои записи".
+
+    Хранит не больше max_users пользователей, вытесняя тех, кто давно не
+    заходил. Записи, время которых прошло, отбрасываются при чтении,
+    а весь список перечитывается из базы не реже раза в ttl_seconds.
+    При создании, подтверждении и отмене записи бот обновляет кэш через
+    update_booking, поэтому повторное нажатие не обращается к базе.
+    """
+
+    def __init__(self, max_users=1000, ttl_seconds=600):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        # user_id -> (записи в порядке убывания номера, истекает в monotonic)
+        self._entries = OrderedDict()
+
+    def get(self, user_id, now=None):
+        """Актуальные записи пользователя или None, если их нужно загрузить"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        bookings, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[user_id]
+            return None
+
+        self._entries.move_to_end(user_id)
+        now_ts = to_epoch(now or datetime.now())
+        # Записи с некорректной датой (start_ts is None) показываются всегда, как и в базе
+        upcoming = [booking for booking in bookings if booking.get('start_ts') is None or booking['start_ts'] >= now_ts]
+        if len(upcoming) != len(bookings):
+            self._entries[user_id] = (upcoming, expires_at)
+        return list(upcoming)
+
+    def put(self, user_id, bookings):
+        """Запоминает записи пользователя, загруженные из базы"""
+        self._entries[user_id] = (list(bookings), time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def update_booking(self, booking):
+        """Добавляет или заменяет запись в кэше ее владельца, если он закэширован"""
+        entry = self._entries.get(booking.get('user_id'))
+        if entry is None:
+            return
+        bookings, expires_at = entry
+        bookings = [cached for cached in bookings if cached['id'] != booking['id']]
+        bookings.append(dict(booking))
+        bookings.sort(key=lambda cached: cached['id'], reverse=True)
+        self._entries[booking['user_id']] = (bookings, expires_at)
+
+    def invalidate(self, user_id):
+        """Убирает пользователя из кэша"""
+        self._entries.pop(user_id, None)
@@ -0,0 +1,168 @@
+import hmac
+import json
+import time
+import asyncio
+import logging
+from http import HTTPStatus
+from contextlib import suppress
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Обновление Telegram намного меньше; больший запрос отклоняется
+MAX_BODY_BYTES = 1024 * 1024
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+
+class WebhookServer:
+    """HTTP-сервер в цикле событий бота для режима webhook.
+
+    Обновления, которые Telegram присылает POST-запросом на path,
+    проверяются по заголовку X-Telegram-Bot-Api-Secret-Token и кладутся в
+    application.update_queue - дальше их обрабатывает само приложение, как
+    при long polling. Остальные пути берутся из routes: путь -> корутина
+    без аргументов, возвращающая (код ответа, dict или строка). Сервер
+    понимает HTTP/1.1 с Content-Length и держит соединение открытым, пока
+    клиент его не закроет.
+    """
+
+    def __init__(self, application, path, secret_token, routes=None, host='0.0.0.0', port=8443,
+                 idle_timeout=75):
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.routes = routes or {}
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.started_at = None
+        self.updates_received = 0
+        self.updates_rejected = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.started_at = time.time()
+        logger.info(f"Webhook-сервер слушает {self.host}:{self.port}, обновления на {self.path}")
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    def stats(self):
+        """Счетчики сервера для /status"""
+        return {
+            'uptime_seconds': round(time.time() - self.started_at) if self.started_at else 0,
+            'updates_received': self.updates_received,
+            'updates_rejected': self.updates_rejected,
+            'update_queue_size': self.application.update_queue.qsize(),
+        }
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.idle_timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+                parts = request_line.split(' ')
+                if len(parts) != 3:
+                    await self._respond(writer, 400, 'Bad Request', keep_alive=False)
+                    break
+                method, target, version = parts
+                headers = {}
+                for line in header_lines:
+                    name, separator, value = line.partition(':')
+                    if separator:
+                        headers[name.strip().lower()] = value.strip()
+
+                if 'transfer-encoding' in headers:
+                    await self._respond(writer, 411, 'Length Required', keep_alive=False)
+                    break
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_BODY_BYTES:
+                    status = 413 if length > MAX_BODY_BYTES else 400
+                    await self._respond(writer, status, HTTPStatus(status).phrase, keep_alive=False)
+                    break
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(length), self.idle_timeout) if length else b''
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                status, payload = await self._dispatch(method, target.split('?', 1)[0], headers, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, payload, keep_alive=keep_alive, head_only=method == 'HEAD')
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка обработки HTTP-запроса: {e}")
+        finally:
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+
+    async def _dispatch(self, method, path, headers, body):
+        if path == self.path:
+            if method != 'POST':
+                return 405, 'Method Not Allowed'
+            return await self._receive_update(headers, body)
+
+        route = self.routes.get(path)
+        if route is None:
+            return 404, 'Not Found'
+        if method not in ('GET', 'HEAD'):
+            return 405, 'Method Not Allowed'
+        try:
+            return await route()
+        except Exception as e:
+            logger.error(f"Ошибка обработчика {path}: {e}")
+            return 500, f"Error: {e}"
+
+    async def _receive_update(self, headers, body):
+        token = headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.updates_rejected += 1
+            logger.warning("Webhook: запрос с неверным секретным токеном отклонен")
+            return 403, 'Forbidden'
+        try:
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise TypeError(f"ожидался объект JSON, получен {type(payload).__name__}")
+            update = Update.de_json(payload, self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            update = None
+            logger.warning(f"Webhook: некорректное обновление: {e}")
+        if update is None:
+            self.updates_rejected += 1
+            return 400, 'Bad Request'
+        await self.application.update_queue.put(update)
+        self.updates_received += 1
+        return 200, 'OK'
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive=True, head_only=False):
+        if isinstance(payload, (dict, list)):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            body = str(payload).encode('utf-8')
+            content_type = 'text/plain; charset=utf-8'
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + (b'' if head_only else body))
+        await writer.drain()
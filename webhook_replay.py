@@ -0,0 +1,61 @@
+"""Отправляет записанные обновления Telegram на webhook-сервер бота.
+
+Нужен для проверки режима webhook на своей машине без Telegram:
+    python webhook_replay.py updates.json --url http://127.0.0.1:8443/telegram
+
+Файл - JSON-массив обновлений (как поле result в ответе getUpdates) или
+JSON Lines, по обновлению в строке. Секретный токен берется из
+WEBHOOK_SECRET в .env или из аргумента --secret.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import httpx
+from dotenv import load_dotenv
+
+
+def load_updates(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    if not content:
+        return []
+    if content.startswith('['):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def main():
+    load_dotenv()
+    default_url = f"http://127.0.0.1:{os.getenv('WEBHOOK_PORT', 8443)}{os.getenv('WEBHOOK_PATH', '/telegram')}"
+    parser = argparse.ArgumentParser(description="Отправка записанных обновлений на webhook бота")
+    parser.add_argument('file', help="JSON-массив или JSON Lines с обновлениями")
+    parser.add_argument('--url', default=default_url, help=f"адрес webhook (по умолчанию {default_url})")
+    parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET', ''), help="секретный токен webhook")
+    parser.add_argument('--delay', type=float, default=0.0, help="пауза между обновлениями, секунд")
+    args = parser.parse_args()
+
+    if not args.secret:
+        print("ERROR: Не задан секретный токен (WEBHOOK_SECRET или --secret)")
+        return 1
+
+    updates = load_updates(args.file)
+    failed = 0
+    with httpx.Client(timeout=10) as client:
+        for update in updates:
+            response = client.post(
+                args.url, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': args.secret}
+            )
+            print(f"update_id={update.get('update_id')}: {response.status_code} {response.text}")
+            if response.status_code != 200:
+                failed += 1
+            if args.delay:
+                time.sleep(args.delay)
+    print(f"Отправлено обновлений: {len(updates)}, с ошибкой: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())